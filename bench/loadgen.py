@@ -0,0 +1,318 @@
+# bench/loadgen.py
+"""
+Open N concurrent /ws sessions that run scripted text, skill and audio turns,
+then report throughput and p50/p95/p99 time-to-first-token (TTFT),
+time-to-first-audio (TTFA) and end-to-end turn latency.
+
+    python -m bench.loadgen --url ws://127.0.0.1:8000/ws --sessions 20 --turns 10 --out bench/results/run.json
+    python -m bench.loadgen ... --compare bench/results/baseline.json
+
+Results are written as JSON so runs can be compared between commits.
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from websockets.asyncio.client import connect
+
+from services import audio_frames
+from services.vad import read_wav_pcm16
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURE = ROOT / "uploads" / "stream_output.wav"
+MIC_FRAME_BYTES = 4096  # 128 ms of 16 kHz PCM16, same as the browser
+
+TEXT_PROMPTS = [
+    "Hi Byte, how are you today?",
+    "Explain recursion in two sentences.",
+    "Give me three ideas for a rainy weekend.",
+    "What is the difference between TCP and UDP?",
+    "Tell me a joke about databases.",
+]
+METRICS = ("ttft_ms", "ttfa_ms", "e2e_ms", "stt_ms", "cancel_ms")
+
+
+@dataclass
+class TurnResult:
+    kind: str
+    ok: bool = True
+    error: str = ""
+    metrics: Dict[str, float] = field(default_factory=dict)
+
+
+class Session:
+    def __init__(self, ws, args):
+        self.ws = ws
+        self.args = args
+        self.events: asyncio.Queue = asyncio.Queue()
+        self.reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        try:
+            async for message in self.ws:
+                self.events.put_nowait((time.perf_counter(), message))
+        finally:
+            self.events.put_nowait((time.perf_counter(), None))
+
+    async def next_event(self, deadline: float):
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            raise asyncio.TimeoutError
+        at, message = await asyncio.wait_for(self.events.get(), remaining)
+        if message is None:
+            raise ConnectionError("socket closed")
+        return at, message
+
+    def drain(self):
+        while not self.events.empty():
+            self.events.get_nowait()
+
+    async def configure(self):
+        keys = {k: "bench" for k in ("assembly", "gemini", "news", "weather")}
+        keys["murf"] = "bench" if self.args.tts else ""
+        keys["serp"] = "bench" if self.args.search else ""
+        await self.ws.send(json.dumps({"type": "config", "keys": keys}))
+        deadline = time.perf_counter() + self.args.timeout
+        while True:
+            _, message = await self.next_event(deadline)
+            if isinstance(message, str) and json.loads(message).get("type") == "system":
+                return
+
+    async def collect_reply(self, t0: float, result: TurnResult, deadline: float, expect_audio: bool, ignore_turn: str = ""):
+        """Wait for the assistant reply (and its audio) and record TTFT/TTFA/E2E from `t0`.
+
+        Fallback and error replies (the server's `error` field) count as failed turns.
+        """
+        got_text = got_audio = False
+        stream_id = None  # audio for this reply carries its turn id; anything else is left over
+        while not (got_text and (got_audio or not expect_audio)):
+            at, message = await self.next_event(deadline)
+            if isinstance(message, bytes):
+                header, _ = audio_frames.parse_frame(message)
+                if header.stream_id != stream_id:
+                    continue
+                result.metrics.setdefault("ttfa_ms", (at - t0) * 1000)
+                if header.flags & audio_frames.FLAG_END_STREAM:
+                    got_audio = True
+                continue
+            msg = json.loads(message)
+            if msg.get("type") == "cancelled":
+                result.metrics.setdefault("cancel_ms", (at - t0) * 1000)
+            if ignore_turn and msg.get("turn") == ignore_turn:
+                continue
+            if msg.get("type") in ("assistant_delta", "assistant"):
+                result.metrics.setdefault("ttft_ms", (at - t0) * 1000)
+                if stream_id is None and msg.get("turn"):
+                    stream_id = int(msg["turn"], 16)
+            if msg.get("type") == "assistant":
+                got_text = True
+                if msg.get("error") or msg.get("text", "").startswith("⚠️"):
+                    result.ok, result.error = False, f"{msg.get('error', 'error')}: {msg['text'][:120]}"
+                    break  # don't wait for (or time) a fallback's audio
+        result.metrics["e2e_ms"] = (time.perf_counter() - t0) * 1000
+
+    async def text_turn(self, i: int) -> TurnResult:
+        result = TurnResult("text")
+        text = TEXT_PROMPTS[i % len(TEXT_PROMPTS)]
+        if self.args.vary:
+            text += f" (variant {random.randrange(1 << 30)})"
+        t0 = time.perf_counter()
+        await self.ws.send(json.dumps({"type": "final", "text": text}))
+        await self.collect_reply(t0, result, t0 + self.args.timeout, self.args.tts)
+        return result
+
+    async def barge_turn(self, i: int) -> TurnResult:
+        """Interrupt a reply as soon as it starts; cancel_ms is how long the server takes to drop it."""
+        result = TurnResult("barge")
+        await self.ws.send(json.dumps({"type": "final", "text": TEXT_PROMPTS[i % len(TEXT_PROMPTS)] + " In detail."}))
+        deadline = time.perf_counter() + self.args.timeout
+        first_turn = ""
+        while not first_turn:
+            _, message = await self.next_event(deadline)
+            if isinstance(message, str):
+                first_turn = json.loads(message).get("turn", "")
+        t0 = time.perf_counter()
+        await self.ws.send(json.dumps({"type": "final", "text": TEXT_PROMPTS[(i + 1) % len(TEXT_PROMPTS)]}))
+        await self.collect_reply(t0, result, t0 + self.args.timeout, self.args.tts, ignore_turn=first_turn)
+        return result
+
+    async def skill_turn(self, i: int) -> TurnResult:
+        result = TurnResult("skill")
+        msg = {"type": "skill", "name": "news"} if i % 2 == 0 else {"type": "skill", "name": "weather", "city": "Lucknow"}
+        t0 = time.perf_counter()
+        await self.ws.send(json.dumps(msg))
+        deadline = t0 + self.args.timeout
+        while True:
+            at, message = await self.next_event(deadline)
+            if isinstance(message, str) and json.loads(message).get("type") == "assistant":
+                result.metrics["ttft_ms"] = result.metrics["e2e_ms"] = (at - t0) * 1000
+                msg = json.loads(message)
+                text = msg.get("text", "")
+                if msg.get("error") or text.startswith(("⚠️", "❗")):
+                    result.ok, result.error = False, f"{msg.get('error', 'error')}: {text[:120]}"
+                return result
+
+    async def audio_turn(self, pcm: bytes) -> TurnResult:
+        result = TurnResult("audio")
+        stream_id = random.randrange(1, 1 << 32)
+        pace = MIC_FRAME_BYTES / 32000 / self.args.audio_speed
+        seq = 0
+        for off in range(0, len(pcm), MIC_FRAME_BYTES):
+            await self.ws.send(audio_frames.encode_frame(audio_frames.CODEC_PCM16, stream_id, seq, pcm[off:off + MIC_FRAME_BYTES]))
+            seq += 1
+            await asyncio.sleep(pace)
+        # latency is measured from the moment the user stops talking
+        t0 = time.perf_counter()
+        await self.ws.send(audio_frames.encode_frame(audio_frames.CODEC_PCM16, stream_id, seq, b"", audio_frames.FLAG_END_STREAM))
+        deadline = t0 + self.args.timeout
+        while "stt_ms" not in result.metrics:
+            at, message = await self.next_event(deadline)
+            if isinstance(message, str):
+                msg = json.loads(message)
+                if msg.get("type") == "user":
+                    result.metrics["stt_ms"] = (at - t0) * 1000
+                elif msg.get("type") == "system" and msg.get("text", "").startswith(("⚠️", "❗")):
+                    raise RuntimeError(msg["text"])
+        await self.collect_reply(t0, result, deadline, self.args.tts)
+        return result
+
+
+async def run_session(n: int, args, pcm: bytes, results: List[TurnResult]):
+    await asyncio.sleep(args.ramp_s * n / max(1, args.sessions))
+    kinds = args.mix.split(",")
+    async with connect(args.url, max_size=None) as ws:
+        session = Session(ws, args)
+        await session.configure()
+        for i in range(args.turns):
+            kind = kinds[(n + i) % len(kinds)]
+            session.drain()
+            try:
+                if kind == "text":
+                    result = await session.text_turn(n + i)
+                elif kind == "skill":
+                    result = await session.skill_turn(n + i)
+                elif kind == "barge":
+                    result = await session.barge_turn(n + i)
+                else:
+                    result = await session.audio_turn(pcm)
+            except Exception as e:
+                result = TurnResult(kind, ok=False, error=f"{type(e).__name__}: {e}")
+            results.append(result)
+            if args.think_ms:
+                await asyncio.sleep(args.think_ms / 1000)
+        session.reader.cancel()
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    pos = (len(values) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+def summarize(results: List[TurnResult]) -> Dict:
+    out = {"count": len(results), "errors": sum(not r.ok for r in results)}
+    for metric in METRICS:
+        values = [r.metrics[metric] for r in results if r.ok and metric in r.metrics]
+        if values:
+            out[metric] = {
+                "p50": round(percentile(values, 0.50), 1),
+                "p95": round(percentile(values, 0.95), 1),
+                "p99": round(percentile(values, 0.99), 1),
+                "mean": round(sum(values) / len(values), 1),
+            }
+    return out
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+async def run(args) -> Dict:
+    pcm = read_wav_pcm16(str(FIXTURE))[: int(args.audio_seconds * 32000)] if "audio" in args.mix else b""
+    results: List[TurnResult] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(n, args, pcm, results) for n in range(args.sessions)))
+    wall = time.perf_counter() - start
+
+    by_kind = {kind: summarize([r for r in results if r.kind == kind]) for kind in sorted({r.kind for r in results})}
+    errors = [r.error for r in results if not r.ok]
+    return {
+        "meta": {"commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "args": vars(args)},
+        "wall_s": round(wall, 2),
+        "turns": len(results),
+        "throughput_turns_per_s": round(len(results) / wall, 2) if wall else 0,
+        "overall": summarize(results),
+        "by_kind": by_kind,
+        "sample_errors": sorted(set(errors))[:10],
+    }
+
+
+def print_report(report: Dict, baseline: Optional[Dict] = None):
+    print(f"commit {report['meta']['commit']}: {report['turns']} turns in {report['wall_s']} s "
+          f"({report['throughput_turns_per_s']} turns/s), {report['overall']['errors']} errors")
+    for kind, stats in report["by_kind"].items():
+        for metric in METRICS:
+            if metric not in stats:
+                continue
+            s = stats[metric]
+            line = f"  {kind:6} {metric:8} p50 {s['p50']:8.1f}  p95 {s['p95']:8.1f}  p99 {s['p99']:8.1f}"
+            old = (baseline or {}).get("by_kind", {}).get(kind, {}).get(metric)
+            if old:
+                deltas = [(s[p] - old[p]) / old[p] * 100 if old[p] else 0.0 for p in ("p50", "p95", "p99")]
+                line += "   vs baseline " + " ".join(f"{d:+.0f}%" for d in deltas)
+            print(line)
+    for error in report["sample_errors"]:
+        print(f"  error: {error}")
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    group = parser.add_argument_group("load")
+    group.add_argument("--sessions", type=int, default=10, help="concurrent /ws connections")
+    group.add_argument("--turns", type=int, default=5, help="turns per session")
+    group.add_argument("--mix", default="text,skill,audio", help="turn kinds, cycled per session (text, skill, audio, barge)")
+    group.add_argument("--think-ms", type=float, default=0, help="pause between turns")
+    group.add_argument("--ramp-s", type=float, default=1.0, help="spread session starts over this many seconds")
+    group.add_argument("--timeout", type=float, default=30, help="per-turn timeout")
+    group.add_argument("--tts", action=argparse.BooleanOptionalAction, default=True, help="configure a Murf key and wait for audio")
+    group.add_argument("--search", action="store_true", help="configure a SerpAPI key (web-search routing)")
+    group.add_argument("--vary", action="store_true", help="make every text prompt unique (defeats caches)")
+    group.add_argument("--audio-seconds", type=float, default=3.0, help="length of each spoken turn (from the WAV fixture)")
+    group.add_argument("--audio-speed", type=float, default=1.0, help="send mic audio this many times faster than real time")
+    group.add_argument("--out", help="write the JSON report here")
+    group.add_argument("--compare", help="baseline JSON report to diff against")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/ws")
+    add_arguments(parser)
+    args = parser.parse_args()
+    report = asyncio.run(run(args))
+    finish(report, args)
+
+
+def finish(report: Dict, args):
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(report, baseline)
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print(f"report written to {args.out}")
+    if report["overall"]["errors"] and report["overall"]["errors"] == report["turns"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
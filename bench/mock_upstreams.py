@@ -0,0 +1,269 @@
+# bench/mock_upstreams.py
+"""
+Local stand-ins for Gemini, Murf, NewsAPI, OpenWeather, SerpAPI and AssemblyAI
+streaming, with configurable latency, jitter and error rates per provider.
+
+    python -m bench.mock_upstreams --port 9100 --latency-ms 120 --provider murf:latency=400,errors=0.02
+
+Point the app at it with the *_BASE_URL / ASSEMBLYAI_STREAMING_HOST settings
+(see env_for() below, which bench/run.py uses).
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+
+PROVIDERS = ("gemini", "murf", "news", "weather", "serp", "assembly")
+
+WORDS = (
+    "byte thinks the answer depends on context but here is the short version with a few useful "
+    "details and a small joke about latency budgets caches and coffee"
+).split()
+
+
+@dataclass
+class Profile:
+    latency_ms: float = 100     # mean time to first byte
+    jitter_ms: float = 30       # uniform +/- around the mean
+    error_rate: float = 0.0     # fraction of requests answered with `error_status`
+    error_status: int = 503
+    token_ms: float = 20        # gap between streamed Gemini chunks / partial transcripts
+    reply_words: int = 40       # length of Gemini replies
+
+    async def wait(self):
+        await asyncio.sleep(max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+
+    def fails(self) -> bool:
+        return random.random() < self.error_rate
+
+
+def parse_provider(spec: str, base: Profile) -> Tuple[str, Profile]:
+    """'murf:latency=400,jitter=50,errors=0.02,status=429,token=15,words=60'"""
+    name, _, opts = spec.partition(":")
+    if name not in PROVIDERS:
+        raise argparse.ArgumentTypeError(f"unknown provider {name!r} (expected one of {', '.join(PROVIDERS)})")
+    fields = {"latency": "latency_ms", "jitter": "jitter_ms", "errors": "error_rate",
+              "status": "error_status", "token": "token_ms", "words": "reply_words"}
+    changes = {}
+    for item in filter(None, opts.split(",")):
+        key, _, value = item.partition("=")
+        if key not in fields:
+            raise argparse.ArgumentTypeError(f"unknown option {key!r} for {name}")
+        changes[fields[key]] = int(value) if key in ("status", "words") else float(value)
+    return name, replace(base, **changes)
+
+
+def _reply_text(prompt: str, words: int) -> str:
+    seed = int(hashlib.sha1(prompt.encode()).hexdigest()[:8], 16)
+    rnd = random.Random(seed)
+    out = []
+    for i in range(words):
+        w = rnd.choice(WORDS)
+        out.append(w.capitalize() if i == 0 or out[-1].endswith(".") else w)
+        if i % 9 == 8:
+            out[-1] += "."
+    return " ".join(out).rstrip(".") + "."
+
+
+def _error(profile: Profile) -> JSONResponse:
+    return JSONResponse({"error": {"message": "mock upstream failure"}, "message": "mock upstream failure"},
+                        status_code=profile.error_status)
+
+
+def build_app(profiles: Dict[str, Profile]) -> FastAPI:
+    app = FastAPI()
+    app.state.counts = {p: 0 for p in PROVIDERS}
+
+    def hit(name: str) -> Profile:
+        app.state.counts[name] += 1
+        return profiles[name]
+
+    @app.get("/health")
+    async def health():
+        return {"ok": True, "requests": app.state.counts}
+
+    # ---------------- Gemini ---------------- #
+    @app.post("/v1beta/models/{model_action}")
+    async def gemini(model_action: str, request: Request):
+        profile = hit("gemini")
+        body = await request.json()
+        prompt = json.dumps(body.get("contents", [])[-1:])
+        await profile.wait()
+        if profile.fails():
+            return _error(profile)
+        text = _reply_text(prompt, profile.reply_words)
+        if "yes' or 'no' only" in prompt:
+            text = "no"
+
+        if model_action.endswith(":generateContent"):
+            return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+        async def sse():
+            words = text.split(" ")
+            for i in range(0, len(words), 3):
+                chunk = " ".join(words[i:i + 3]) + (" " if i + 3 < len(words) else "")
+                data = {"candidates": [{"content": {"role": "model", "parts": [{"text": chunk}]}}]}
+                yield f"data: {json.dumps(data)}\r\n\r\n"
+                await asyncio.sleep(profile.token_ms / 1000)
+
+        return StreamingResponse(sse(), media_type="text/event-stream")
+
+    # ---------------- Murf ---------------- #
+    @app.post("/v1/speech/generate")
+    async def murf(request: Request):
+        profile = hit("murf")
+        body = await request.json()
+        await profile.wait()
+        if profile.fails():
+            return _error(profile)
+        # roughly 48 kbps MP3 at ~15 characters of speech per second
+        size = max(2048, len(body.get("text", "")) * 400)
+        return {"audioFile": f"{str(request.base_url).rstrip('/')}/murf-audio/{size}.mp3", "audioLengthInSeconds": size / 6000}
+
+    @app.get("/murf-audio/{size}.mp3")
+    async def murf_audio(size: int):
+        frame = b"\xff\xfb\x90\x64" + b"\x00" * 413  # one silent 48 kbps MPEG-1 layer III frame
+        return Response((frame * (size // len(frame) + 1))[:size], media_type="audio/mpeg")
+
+    # ---------------- NewsAPI / OpenWeather / SerpAPI ---------------- #
+    @app.get("/v2/top-headlines")
+    async def news(apiKey: str = ""):
+        profile = hit("news")
+        await profile.wait()
+        if profile.fails():
+            return _error(profile)
+        if not apiKey:
+            return JSONResponse({"status": "error", "message": "apiKey missing"}, status_code=401)
+        return {"status": "ok", "articles": [{"title": f"Mock headline {i + 1}"} for i in range(5)]}
+
+    @app.get("/data/2.5/weather")
+    async def weather(q: str = "", appid: str = ""):
+        profile = hit("weather")
+        await profile.wait()
+        if profile.fails():
+            return _error(profile)
+        if q.lower() == "nowhere":
+            return JSONResponse({"cod": "404", "message": "city not found"}, status_code=404)
+        temp = 20 + int(hashlib.sha1(q.lower().encode()).hexdigest()[:2], 16) % 15
+        return {"main": {"temp": temp}, "weather": [{"description": "mock clouds"}], "name": q}
+
+    @app.get("/search.json")
+    async def serp(q: str = ""):
+        profile = hit("serp")
+        await profile.wait()
+        if profile.fails():
+            return _error(profile)
+        return {"organic_results": [{"title": f"Result {i + 1}", "snippet": f"Mock snippet {i + 1} about {q}"} for i in range(5)]}
+
+    # ---------------- AssemblyAI streaming (v3) ---------------- #
+    @app.websocket("/v3/ws")
+    async def assembly(ws: WebSocket):
+        profile = hit("assembly")
+        await ws.accept()
+        await profile.wait()
+        if profile.fails():
+            await ws.close(code=4000 + profile.error_status % 1000, reason="mock upstream failure")
+            return
+        expires = (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat()
+        await ws.send_json({"type": "Begin", "id": f"mock-{time.monotonic_ns()}", "expires_at": expires})
+
+        state = {"order": 0, "turn_s": 0.0, "partial_at": 0.0, "total_s": 0.0}
+
+        def turn(end: bool, formatted: bool = False) -> dict:
+            words = max(1, int(state["turn_s"] * 2.5))
+            text = " ".join(WORDS[i % len(WORDS)] for i in range(words))
+            if formatted:
+                text = text.capitalize() + "."
+            return {"type": "Turn", "turn_order": state["order"], "turn_is_formatted": formatted, "end_of_turn": end,
+                    "transcript": text, "end_of_turn_confidence": 0.9 if end else 0.1, "words": []}
+
+        async def end_turn():
+            if state["turn_s"] <= 0:
+                return
+            await profile.wait()
+            # like AssemblyAI with format_turns: the turn ends unformatted, then again formatted
+            await ws.send_json(turn(True))
+            await ws.send_json(turn(True, formatted=True))
+            state["order"] += 1
+            state["turn_s"] = state["partial_at"] = 0.0
+
+        try:
+            while True:
+                message = await ws.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                if message.get("bytes") is not None:
+                    seconds = len(message["bytes"]) / 32000
+                    state["turn_s"] += seconds
+                    state["total_s"] += seconds
+                    if state["turn_s"] - state["partial_at"] >= 0.4:
+                        state["partial_at"] = state["turn_s"]
+                        await ws.send_json(turn(False))
+                    continue
+                kind = json.loads(message.get("text") or "{}").get("type")
+                if kind == "ForceEndpoint":
+                    await end_turn()
+                elif kind == "Terminate":
+                    await end_turn()
+                    await ws.send_json({"type": "Termination", "audio_duration_seconds": int(state["total_s"]),
+                                        "session_duration_seconds": int(state["total_s"])})
+                    await ws.close()
+                    return
+        except WebSocketDisconnect:
+            return
+
+    return app
+
+
+def env_for(base_url: str) -> Dict[str, str]:
+    """App settings that route every upstream call to a mock server at `base_url`."""
+    host = base_url.split("://", 1)[1]
+    return {
+        "GEMINI_BASE_URL": f"{base_url}/v1beta/models",
+        "MURF_BASE_URL": f"{base_url}/v1",
+        "NEWSAPI_BASE_URL": f"{base_url}/v2",
+        "OPENWEATHER_BASE_URL": f"{base_url}/data/2.5",
+        "SERPAPI_BASE_URL": base_url,
+        "ASSEMBLYAI_STREAMING_HOST": f"ws://{host}",
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    group = parser.add_argument_group("mock upstreams")
+    group.add_argument("--latency-ms", type=float, default=100, help="mean upstream latency for every provider")
+    group.add_argument("--jitter-ms", type=float, default=30)
+    group.add_argument("--error-rate", type=float, default=0.0)
+    group.add_argument("--token-ms", type=float, default=20, help="gap between streamed Gemini chunks")
+    group.add_argument("--provider", action="append", default=[], metavar="NAME:key=value,...",
+                       help="per-provider override, e.g. murf:latency=400,errors=0.05 (keys: latency, jitter, errors, status, token, words)")
+
+
+def profiles_from_args(args) -> Dict[str, Profile]:
+    base = Profile(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate, token_ms=args.token_ms)
+    profiles = {name: base for name in PROVIDERS}
+    for spec in args.provider:
+        name, profile = parse_provider(spec, profiles.get(spec.partition(":")[0], base))
+        profiles[name] = profile
+    return profiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(build_app(profiles_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# bench/run.py
+"""
+One-shot offline benchmark: start the mock upstreams and the app (pointed at
+them), run the load generator, write the JSON report, shut everything down.
+
+    python -m bench.run --sessions 50 --turns 10 --latency-ms 150 --provider murf:latency=400 --out bench/results/$(git rev-parse --short HEAD).json
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench import loadgen, mock_upstreams
+
+ROOT = loadgen.ROOT
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url: str, proc: subprocess.Popen, timeout: float = 20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {proc.returncode}")
+        try:
+            httpx.get(url, timeout=1)  # any HTTP answer means the server is accepting requests
+            return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up in {timeout} s")
+
+
+def mock_argv(args) -> list:
+    argv = ["--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+            "--error-rate", str(args.error_rate), "--token-ms", str(args.token_ms)]
+    for spec in args.provider:
+        argv += ["--provider", spec]
+    return argv
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE", help="extra app setting, e.g. LLM_STREAMING=0")
+    parser.add_argument("--verbose", action="store_true", help="show app and mock server logs")
+    loadgen.add_arguments(parser)
+    mock_upstreams.add_arguments(parser)
+    args = parser.parse_args()
+
+    mock_port, app_port = free_port(), free_port()
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    procs = []
+    output = None if args.verbose else subprocess.DEVNULL
+    with tempfile.TemporaryDirectory() as cache_dir:
+        try:
+            mock = subprocess.Popen([sys.executable, "-m", "bench.mock_upstreams", "--port", str(mock_port)] + mock_argv(args),
+                                    cwd=ROOT, stdout=output, stderr=output)
+            procs.append(mock)
+            wait_ready(f"{mock_url}/health", mock)
+
+            # fresh TTS cache per run so results don't depend on earlier runs
+            env = dict(os.environ, **mock_upstreams.env_for(mock_url), TTS_CACHE_DIR=cache_dir)
+            env.update(item.split("=", 1) for item in args.app_env)
+            app = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(app_port), "--log-level", "warning"],
+                                   cwd=ROOT, env=env, stdout=output, stderr=output)
+            procs.append(app)
+            wait_ready(f"http://127.0.0.1:{app_port}/", app)
+
+            args.url = f"ws://127.0.0.1:{app_port}/ws"
+            report = asyncio.run(loadgen.run(args))
+            report["meta"]["upstream_requests"] = httpx.get(f"{mock_url}/health").json()["requests"]
+        finally:
+            for proc in reversed(procs):
+                proc.terminate()
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+    loadgen.finish(report, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,3 +10,62 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 MURF_API_KEY = os.getenv("MURF_API_KEY", "")
 NEWSAPI_KEY = os.getenv("NEWSAPI_KEY", "")
 OPENWEATHER_KEY = os.getenv("OPENWEATHER_KEY", "")
+
+# Upstream endpoints (override to point at local stand-ins, e.g. bench/mock_upstreams.py)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/models")
+MURF_BASE_URL = os.getenv("MURF_BASE_URL", "https://api.murf.ai/v1")
+NEWSAPI_BASE_URL = os.getenv("NEWSAPI_BASE_URL", "https://newsapi.org/v2")
+OPENWEATHER_BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "http://api.openweathermap.org/data/2.5")
+SERPAPI_BASE_URL = os.getenv("SERPAPI_BASE_URL", "https://serpapi.com")
+ASSEMBLYAI_STREAMING_HOST = os.getenv("ASSEMBLYAI_STREAMING_HOST", "streaming.assemblyai.com")
+
+# Upstream HTTP pool (shared by every session for the lifetime of the app)
+UPSTREAM_POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", "20"))
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "1") == "1"
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "60"))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+
+# Stream Gemini tokens and pipeline TTS per sentence (clients can override per connection)
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1") == "1"
+
+# TTS audio cache (memory LRU + on-disk tier, uploads/tts_cache by default)
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "")
+TTS_CACHE_MEMORY_MB = float(os.getenv("TTS_CACHE_MEMORY_MB", "32"))
+TTS_CACHE_DISK_MB = float(os.getenv("TTS_CACHE_DISK_MB", "256"))
+
+# Skill result cache: fresh for *_TTL seconds, then served stale for up to *_STALE seconds while refreshing
+SKILL_NEWS_TTL = float(os.getenv("SKILL_NEWS_TTL", "300"))
+SKILL_NEWS_STALE = float(os.getenv("SKILL_NEWS_STALE", "900"))
+SKILL_WEATHER_TTL = float(os.getenv("SKILL_WEATHER_TTL", "600"))
+SKILL_WEATHER_STALE = float(os.getenv("SKILL_WEATHER_STALE", "1800"))
+SKILL_CACHE_MAX_ENTRIES = int(os.getenv("SKILL_CACHE_MAX_ENTRIES", "1024"))
+DEFAULT_WEATHER_CITY = os.getenv("DEFAULT_WEATHER_CITY", "Lucknow")
+
+# Streaming STT: warm AssemblyAI sessions kept per key, and the per-utterance audio queue bound
+STT_POOL_SIZE = int(os.getenv("STT_POOL_SIZE", "1"))
+STT_POOL_MAX_IDLE = float(os.getenv("STT_POOL_MAX_IDLE", "60"))
+STT_QUEUE_FRAMES = int(os.getenv("STT_QUEUE_FRAMES", "32"))
+
+# Local voice activity detection in front of streaming STT ("webrtc" model needs the webrtcvad package)
+VAD_ENABLED = os.getenv("VAD_ENABLED", "1") == "1"
+VAD_END_OF_SPEECH_MS = int(os.getenv("VAD_END_OF_SPEECH_MS", "700"))
+VAD_MODEL = os.getenv("VAD_MODEL", "")
+
+# Per-connection conversation memory: token budget for history sent to Gemini, and whether
+# turns evicted past the budget are folded into a background summary
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "2000"))
+MEMORY_SUMMARIZE = os.getenv("MEMORY_SUMMARIZE", "1") == "1"
+
+# Send a per-turn timing breakdown ({"type": "trace"}) over /ws by default (clients can opt in per connection)
+TRACE_TURNS = os.getenv("TRACE_TURNS", "0") == "1"
+
+# Per-connection limits: queued outbound /ws messages (a client that leaves it full for
+# WS_SEND_TIMEOUT seconds is disconnected) and skills running next to the current reply
+WS_SEND_QUEUE_MESSAGES = int(os.getenv("WS_SEND_QUEUE_MESSAGES", "64"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+WS_MAX_BACKGROUND_JOBS = int(os.getenv("WS_MAX_BACKGROUND_JOBS", "4"))
+
+# Per-provider admission control, retries and circuit breakers (services/policy.py).
+# Override the defaults as "provider:key=value,...;provider:...", e.g.
+# UPSTREAM_POLICY="gemini:concurrency=8,rate=5;murf:retries=1,failures=3"
+UPSTREAM_POLICY = os.getenv("UPSTREAM_POLICY", "")
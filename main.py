@@ -1,9 +1,40 @@
+from contextlib import aclosing, asynccontextmanager
 from fastapi import FastAPI, WebSocket, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-import logging, base64, requests, httpx
+import asyncio, functools, json, logging, time
 
-app = FastAPI()
+import config
+from services import audio_frames, llm, metrics, policy, stt, tts, upstream, vad
+from services.connection import Outbox, SlowClientError, TurnScheduler
+from services.memory import ConversationMemory
+from services.skill_cache import SkillCache
+
+
+def make_vad():
+    model = vad.webrtcvad_model() if config.VAD_MODEL == "webrtc" else None
+    return vad.VoiceActivityDetector(end_of_speech_ms=config.VAD_END_OF_SPEECH_MS, model=model)
+
+
+stt_manager = stt.STTSessionManager(
+    pool_size=config.STT_POOL_SIZE,
+    max_idle=config.STT_POOL_MAX_IDLE,
+    max_queued_frames=config.STT_QUEUE_FRAMES,
+    vad_factory=make_vad if config.VAD_ENABLED else None,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # upstream connection pools live for the whole app, not per turn
+    await upstream.startup()
+    yield
+    await stt_manager.close()
+    await upstream.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
@@ -11,34 +42,386 @@ logging.basicConfig(level=logging.INFO)
 
 
 # ---------------- SPECIAL SKILLS ---------------- #
-def get_latest_news(api_key: str):
+NEWSAPI_URL = f"{config.NEWSAPI_BASE_URL}/top-headlines"
+OPENWEATHER_URL = f"{config.OPENWEATHER_BASE_URL}/weather"
+
+
+skill_cache = SkillCache(max_entries=config.SKILL_CACHE_MAX_ENTRIES)
+metrics.StatsCollector("byte_skill_cache", "Skill result cache", skill_cache.stats)
+
+
+async def _fetch_news(api_key: str) -> str:
+    params = {"category": "technology", "language": "en", "apiKey": api_key}
+    r = await upstream.get(NEWSAPI_URL, provider="newsapi", params=params, timeout=8)
+    upstream.raise_for_status(r, "newsapi")
+    arts = r.json().get("articles", [])[:5]
+    if not arts:
+        return "⚠️ No tech headlines returned."
+    headlines = [a.get("title", "Untitled") for a in arts]
+    return "📰 Tech Headlines:\n" + "\n".join(f"- {h}" for h in headlines)
+
+
+async def _fetch_weather(api_key: str, city: str) -> str:
+    params = {"q": city, "appid": api_key, "units": "metric"}
+    r = await upstream.get(OPENWEATHER_URL, provider="openweather", params=params, timeout=8)
+    if r.status_code == 404:
+        return f"❌ Could not fetch weather for {city}."
+    upstream.raise_for_status(r, "openweather")
+    res = r.json()
+    temp = res["main"]["temp"]
+    cond = res["weather"][0]["description"]
+    return f"☁️ Weather in {city}: {temp}°C — {cond}"
+
+
+# skills return (text, error); error is None, "unavailable" or "failed" as in assistant_message.
+# When the provider is down (breaker open or a 5xx) an expired cached answer beats an error.
+SKILL_FALLBACK_ON = (policy.ProviderUnavailable, upstream.UpstreamServerError)
+
+
+async def get_latest_news(api_key: str):
     if not api_key:
-        return "❗ No NewsAPI key provided in Config."
-    url = f"https://newsapi.org/v2/top-headlines?category=technology&language=en&apiKey={api_key}"
+        return "❗ No NewsAPI key provided in Config.", "failed"
     try:
-        res = requests.get(url, timeout=8).json()
-        arts = res.get("articles", [])[:5]
-        if not arts:
-            return "⚠️ No tech headlines returned."
-        headlines = [a.get("title", "Untitled") for a in arts]
-        return "📰 Tech Headlines:\n" + "\n".join(f"- {h}" for h in headlines)
+        return await skill_cache.get(
+            ("news", api_key), lambda: _fetch_news(api_key),
+            ttl=config.SKILL_NEWS_TTL, stale_ttl=config.SKILL_NEWS_STALE, fallback_on=SKILL_FALLBACK_ON,
+        ), None
+    except policy.ProviderUnavailable:
+        return "📰 News is unavailable right now, try again in a minute.", "unavailable"
     except Exception as e:
-        return f"⚠️ News API error: {e}"
+        return f"⚠️ News API error: {e}", "failed"
 
 
-def get_weather(api_key: str, city: str = "Lucknow"):
+async def get_weather(api_key: str, city: str = config.DEFAULT_WEATHER_CITY):
     if not api_key:
-        return "❗ No OpenWeather key provided in Config."
-    url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={api_key}&units=metric"
+        return "❗ No OpenWeather key provided in Config.", "failed"
+    city = " ".join(str(city or "").split())[:64] or config.DEFAULT_WEATHER_CITY
     try:
-        res = requests.get(url, timeout=8).json()
-        if res.get("main"):
-            temp = res["main"]["temp"]
-            cond = res["weather"][0]["description"]
-            return f"☁️ Weather in {city}: {temp}°C — {cond}"
-        return f"❌ Could not fetch weather for {city}."
+        return await skill_cache.get(
+            ("weather", api_key, city.casefold()), lambda: _fetch_weather(api_key, city),
+            ttl=config.SKILL_WEATHER_TTL, stale_ttl=config.SKILL_WEATHER_STALE, fallback_on=SKILL_FALLBACK_ON,
+        ), None
+    except policy.ProviderUnavailable:
+        return f"🌤️ Weather for {city} is unavailable right now, try again in a minute.", "unavailable"
     except Exception as e:
-        return f"⚠️ Weather API error: {e}"
+        return f"⚠️ Weather API error: {e}", "failed"
+
+
+# ---------------- INSTRUMENTATION ---------------- #
+mic_streams_open = set()   # every live MicStream, for the gauges below
+audio_queues_open = set()  # per-turn queues of TTS clips waiting to be sent
+
+metrics.Gauge("byte_mic_streams_active", "Mic streams with an open STT session", fn=lambda: len(mic_streams_open))
+metrics.Gauge("byte_stt_audio_queue_depth", "Audio chunks queued for STT, all sessions",
+              fn=lambda: sum(m.session.queue_depth for m in mic_streams_open))
+metrics.Gauge("byte_tts_send_queue_depth", "TTS clips queued for sending, all turns",
+              fn=lambda: sum(q.qsize() for q in audio_queues_open))
+metrics.StatsCollector("byte_stt_pool", "STT session pool", stt_manager.stats)
+
+
+async def send_json(ws: Outbox, data: dict):
+    await ws.send_text(json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+
+
+async def send_trace(ws: Outbox, trace: metrics.TurnTrace, conn_opts: dict):
+    """Per-turn timing breakdown for debugging (clients opt in with `"trace": true` in config)."""
+    if conn_opts["trace"]:
+        await send_json(ws, {"type": "trace", **trace.summary()})
+
+
+# ---------------- REPLY PIPELINE ---------------- #
+def assistant_message(turn_id: str, text: str, error: str = None) -> dict:
+    """Final reply of a turn; `error` ("unavailable" / "failed") marks fallback and error replies."""
+    msg = {"type": "assistant", "turn": turn_id, "text": text}
+    if error:
+        msg["error"] = error
+    return msg
+
+
+async def send_audio(ws: Outbox, audio: bytes, stream_id: int, first_seq: int, flags: int = audio_frames.FLAG_END_SEGMENT) -> int:
+    """Send one clip as binary frames; returns the next sequence number."""
+    seq = first_seq
+    metrics.mark("first_audio")
+    for frame in audio_frames.iter_frames(audio, audio_frames.CODEC_MP3, stream_id, first_seq, flags):
+        await ws.send_bytes(frame)
+        seq += 1
+    return seq
+
+
+async def send_audio_in_order(ws: Outbox, queue: asyncio.Queue, stream_id: int):
+    """Await queued TTS tasks in sentence order and stream each clip as soon as it is ready."""
+    seq = 0
+    while True:
+        task = await queue.get()
+        if task is None:
+            break
+        try:
+            audio = await task
+        except Exception as e:
+            logging.error(f"TTS error: {e}")
+            continue
+        seq = await send_audio(ws, audio, stream_id, seq)
+    if seq:
+        await ws.send_bytes(audio_frames.encode_frame(audio_frames.CODEC_MP3, stream_id, seq, b"", audio_frames.FLAG_END_STREAM))
+
+
+async def stream_reply(ws: Outbox, user_text: str, conn_keys: dict, memory: ConversationMemory, turn_id: str):
+    """Stream Gemini deltas to the client and synthesize each sentence while later tokens arrive."""
+    chunker = llm.SentenceChunker()
+    audio_q: asyncio.Queue = asyncio.Queue()
+    audio_queues_open.add(audio_q)
+    # audio frames for this turn carry the turn id as their stream id
+    sender = asyncio.create_task(send_audio_in_order(ws, audio_q, int(turn_id, 16)))
+    pending = []
+
+    def queue_tts(sentence: str):
+        if conn_keys["murf"] and sentence:
+            task = asyncio.create_task(tts.synthesize(sentence, conn_keys["murf"]))
+            pending.append(task)
+            audio_q.put_nowait(task)
+
+    parts = []
+    error = None
+    try:
+        try:
+            # aclosing: if the turn is interrupted, the Gemini stream (and its connection) is released right away
+            async with aclosing(llm.stream_routed_response(user_text, memory.contents(), conn_keys["gemini"], conn_keys["serp"])) as deltas:
+                async for delta in deltas:
+                    parts.append(delta)
+                    metrics.mark("first_token")
+                    await send_json(ws, {"type": "assistant_delta", "turn": turn_id, "text": delta})
+                    for sentence in chunker.feed(delta):
+                        queue_tts(sentence)
+            queue_tts(chunker.flush())
+            memory.add_exchange(user_text, "".join(parts))
+        except policy.ProviderUnavailable as e:
+            # breaker open / saturated: answer right away instead of waiting on Gemini
+            logging.warning(f"Gemini skipped: {e}")
+            error = "unavailable"
+            if not parts:
+                parts.append(llm.FALLBACK_REPLY)
+                queue_tts(llm.FALLBACK_REPLY)
+        except Exception as e:
+            logging.error(f"Gemini stream error: {e}")
+            error = "failed"
+            # keep what was already streamed, cut off like an interrupted reply
+            partial = "".join(parts).rstrip()
+            parts = [f"{partial} … {llm.ERROR_REPLY}" if partial else llm.ERROR_REPLY]
+        await send_json(ws, assistant_message(turn_id, "".join(parts), error))
+        audio_q.put_nowait(None)
+        await sender
+    finally:
+        audio_queues_open.discard(audio_q)
+        # only has work to do if the socket failed mid-turn
+        sender.cancel()
+        for task in pending:
+            task.cancel()
+
+
+async def full_reply(ws: Outbox, user_text: str, conn_keys: dict, memory: ConversationMemory, turn_id: str):
+    """Non-streaming path: one assistant message, then one TTS request for the whole reply."""
+    history = memory.contents()
+    reply, new_history = await llm.get_routed_response(user_text, history, conn_keys["gemini"], conn_keys["serp"])
+    error = None
+    if len(new_history) > len(history):  # unchanged history means the request failed
+        memory.add_exchange(user_text, reply)
+    else:
+        error = "unavailable" if reply == llm.FALLBACK_REPLY else "failed"
+    metrics.mark("first_token")
+    await send_json(ws, assistant_message(turn_id, reply, error))
+
+    if conn_keys["murf"] and reply != llm.ERROR_REPLY:
+        try:
+            audio = await tts.synthesize(reply, conn_keys["murf"])
+            await send_audio(ws, audio, int(turn_id, 16), 0, audio_frames.FLAG_END_SEGMENT | audio_frames.FLAG_END_STREAM)
+        except Exception as e:
+            logging.error(f"TTS error: {e}")
+
+
+async def reply(ws: Outbox, user_text: str, conn_keys: dict, conn_opts: dict, memory: ConversationMemory, trace: metrics.TurnTrace):
+    if conn_opts["stream"]:
+        await stream_reply(ws, user_text, conn_keys, memory, trace.turn_id)
+    else:
+        await full_reply(ws, user_text, conn_keys, memory, trace.turn_id)
+    await send_trace(ws, trace, conn_opts)
+
+
+async def skill_reply(ws: Outbox, msg: dict, conn_keys: dict, conn_opts: dict, trace: metrics.TurnTrace):
+    name = msg["name"]
+    with metrics.span(f"skill_{name}"):
+        if name == "news":
+            resp, error = await get_latest_news(conn_keys["news"])
+        else:
+            resp, error = await get_weather(conn_keys["weather"], msg.get("city"))
+    await send_json(ws, assistant_message(trace.turn_id, resp, error))
+    await send_trace(ws, trace, conn_opts)
+
+
+# ---------------- VOICE INPUT ---------------- #
+class MicStream:
+    """One utterance streamed from the browser mic (binary PCM16 frames) into a pooled STT session.
+
+    The session is opened in a background task so the receive loop never waits on
+    the STT handshake; frames that arrive meanwhile are buffered (up to the STT
+    queue size) and replayed once it is ready. If it can't be opened, the rest of
+    the utterance is dropped. A consumer task relays partial transcripts and hands
+    each final one to the connection's scheduler as a voice turn; it keeps running
+    after the client ends the stream until the last transcript has arrived.
+    """
+
+    def __init__(self, ws: Outbox, stream_id: int, mic_streams: dict, conn_keys: dict, conn_opts: dict,
+                 memory: ConversationMemory, scheduler: TurnScheduler):
+        self.ws = ws
+        self.scheduler = scheduler
+        self.stream_id = stream_id
+        self.mic_streams = mic_streams
+        self.conn_keys = conn_keys
+        self.conn_opts = conn_opts
+        self.memory = memory
+        self.session = None
+        self.opener = None
+        self.consumer = None
+        self.failed = False  # the STT session could not be opened; the rest of the utterance is dropped
+        self.aborted = False
+        self.ending = False
+        self.finisher = None
+        self.next_seq = 0
+        self.heard_at = None  # first audio of the utterance being transcribed
+        self._early = []  # audio received while the session is connecting (None once it is live)
+        self.early_dropped = 0
+
+    def start(self):
+        self.mic_streams[self.stream_id] = self
+        self.opener = asyncio.create_task(self._open())
+
+    async def _open(self):
+        try:
+            self.session = await stt_manager.open_session(self.conn_keys["assembly"])
+        except Exception as e:
+            logging.error(f"STT connect error: {e}")
+            # the entry stays until the client ends the stream, so later frames are dropped
+            # instead of each one reconnecting (and erroring) again
+            self.failed = True
+            self._early = None
+            if self.ending:
+                self.mic_streams.pop(self.stream_id, None)
+            try:
+                await send_json(self.ws, {"type": "system", "text": f"⚠️ Speech-to-text error: {e}"})
+            except SlowClientError:
+                pass
+            return
+        if self.aborted:
+            await self.session.abort()
+            return
+        mic_streams_open.add(self)
+        self.consumer = asyncio.create_task(self._consume())
+        self.consumer.add_done_callback(self._closed)
+        # frames arriving while the backlog is replayed are appended to it, so order is kept
+        while self._early:
+            await self.session.feed(self._early.pop(0))
+        self._early = None
+        if self.early_dropped:
+            logging.warning(f"Mic stream {self.stream_id}: dropped {self.early_dropped} frames while connecting")
+        if self.ending:
+            self.finisher = asyncio.create_task(self.session.finish())
+
+    def _closed(self, _):
+        self.mic_streams.pop(self.stream_id, None)
+        mic_streams_open.discard(self)
+
+    async def feed(self, header: audio_frames.FrameHeader, payload: memoryview):
+        if header.seq != self.next_seq:
+            logging.warning(f"Mic stream {self.stream_id}: expected seq {self.next_seq}, got {header.seq}")
+        self.next_seq = header.seq + 1
+        if payload:
+            if self.heard_at is None:
+                self.heard_at = time.perf_counter()
+            if self._early is None:
+                await self.session.feed(payload)
+            elif len(self._early) < stt_manager.max_queued_frames:
+                self._early.append(payload)
+            else:
+                self.early_dropped += 1
+
+    def end(self):
+        """Stop taking audio; the session flushes and terminates in the background."""
+        self.ending = True
+        if self._early is None:
+            self.finisher = asyncio.create_task(self.session.finish())
+        # else: _open finishes the session after replaying the buffered audio
+
+    async def abort(self):
+        self.aborted = True  # a session still connecting is closed as soon as it arrives
+        if self.consumer is not None:
+            self.consumer.cancel()
+            await self.session.abort()
+
+    async def _answer(self, trace: metrics.TurnTrace, event: stt.TranscriptEvent, heard_at, final_at: float):
+        if heard_at is not None:
+            metrics.record("stt", heard_at, final_at)
+        if event.endpoint_at is not None:
+            metrics.record("stt_finalize", event.endpoint_at, final_at)
+        await reply(self.ws, event.text, self.conn_keys, self.conn_opts, self.memory, trace)
+
+    async def _consume(self):
+        try:
+            async for event in self.session:
+                if not event.final:
+                    await send_json(self.ws, {"type": "partial", "text": event.text})
+                    continue
+                final_at = time.perf_counter()
+                heard_at, self.heard_at = self.heard_at, None
+                await send_json(self.ws, {"type": "user", "text": event.text})
+                # the voice turn starts with the user's first audio, so its trace includes STT
+                answer = functools.partial(self._answer, event=event, heard_at=heard_at, final_at=final_at)
+                self.scheduler.start_turn("voice", answer, start=heard_at)
+        except stt.STTError as e:
+            await self.session.abort()
+            try:
+                await send_json(self.ws, {"type": "system", "text": f"⚠️ Speech-to-text error: {e}"})
+            except SlowClientError:
+                pass
+        except SlowClientError:
+            await self.session.abort()  # the outbox has already closed the socket
+        finally:
+            if self.session.dropped_frames:
+                logging.warning(f"Mic stream {self.stream_id}: dropped {self.session.dropped_frames} frames "
+                                f"({self.session.dropped_bytes} bytes) under backpressure")
+            if self.session.vad is not None:
+                logging.info(f"Mic stream {self.stream_id}: VAD trimmed {self.session.vad.trimmed_ratio:.0%} "
+                             f"of {self.session.vad.bytes_in} bytes")
+
+
+async def handle_audio_frame(ws: Outbox, data: bytes, mic_streams: dict, conn_keys: dict, conn_opts: dict,
+                             memory: ConversationMemory, scheduler: TurnScheduler):
+    try:
+        header, payload = audio_frames.parse_frame(data)
+    except audio_frames.FrameError as e:
+        await send_json(ws, {"type": "system", "text": f"⚠️ Bad audio frame: {e}"})
+        return
+
+    mic = mic_streams.get(header.stream_id)
+    if mic is None:
+        if header.codec != audio_frames.CODEC_PCM16:
+            await send_json(ws, {"type": "system", "text": "⚠️ Voice input must be 16 kHz PCM16 frames."})
+            return
+        if not conn_keys["assembly"]:
+            await send_json(ws, {"type": "system", "text": "❗ No AssemblyAI key provided in Config."})
+            return
+        # the user started talking: stop the reply in flight (barge-in)
+        scheduler.interrupt()
+        mic = MicStream(ws, header.stream_id, mic_streams, conn_keys, conn_opts, memory, scheduler)
+        mic.start()
+    elif mic.failed:
+        if header.flags & audio_frames.FLAG_END_STREAM:
+            del mic_streams[header.stream_id]
+        return
+    elif mic.ending:
+        return
+
+    await mic.feed(header, payload)
+    if header.flags & audio_frames.FLAG_END_STREAM:
+        mic.end()
 
 
 # ---------------- ROUTES ---------------- #
@@ -47,78 +430,74 @@ async def home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.websocket("/ws")
 async def ws_endpoint(ws: WebSocket):
     await ws.accept()
     logging.info("WebSocket client connected")
+    metrics.WS_SESSIONS.inc()
 
-    conn_keys = {"assembly": "", "gemini": "", "news": "", "weather": "", "murf": ""}
+    conn_keys = {"assembly": "", "gemini": "", "news": "", "weather": "", "murf": "", "serp": ""}
+    conn_opts = {"stream": config.LLM_STREAMING, "trace": config.TRACE_TURNS}
+    memory = ConversationMemory(
+        token_budget=config.MEMORY_TOKEN_BUDGET,
+        summarizer=(lambda summary, turns: llm.summarize_turns(summary, turns, conn_keys["gemini"]))
+        if config.MEMORY_SUMMARIZE else None,
+    )
+    mic_streams = {}  # stream id -> MicStream (until its last transcript arrives)
+    # replies run off the receive loop, so new input can interrupt them; sends go through a bounded queue
+    out = Outbox(ws, max_items=config.WS_SEND_QUEUE_MESSAGES, max_wait=config.WS_SEND_TIMEOUT)
+    scheduler = TurnScheduler(out, max_background=config.WS_MAX_BACKGROUND_JOBS)
 
     try:
         while True:
-            msg = await ws.receive_json()
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            metrics.WS_MESSAGES.inc("in")
+            if message.get("bytes") is not None:
+                metrics.WS_BYTES.inc("in", amount=len(message["bytes"]))
+                await handle_audio_frame(out, message["bytes"], mic_streams, conn_keys, conn_opts, memory, scheduler)
+                continue
+            metrics.WS_BYTES.inc("in", amount=len(message["text"]))
+            msg = json.loads(message["text"])
 
             if msg.get("type") == "config":
                 for k in conn_keys:
                     if k in msg["keys"]:
                         conn_keys[k] = msg["keys"][k]
-                await ws.send_json({"type": "system", "text": "✅ Config saved."})
+                # connect an STT session now so the first utterance skips the handshake
+                stt_manager.prewarm(conn_keys["assembly"])
+                for opt in ("stream", "trace"):
+                    if opt in msg:
+                        conn_opts[opt] = bool(msg[opt])
+                await send_json(out, {"type": "system", "text": "✅ Config saved."})
 
-            elif msg.get("type") == "skill":
-                if msg["name"] == "news":
-                    resp = get_latest_news(conn_keys["news"])
-                    await ws.send_json({"type": "assistant", "text": resp})
-                elif msg["name"] == "weather":
-                    resp = get_weather(conn_keys["weather"], "Lucknow")
-                    await ws.send_json({"type": "assistant", "text": resp})
+            elif msg.get("type") == "skill" and msg.get("name") in ("news", "weather"):
+                # skills don't touch the conversation, so they run next to the current reply
+                if not scheduler.spawn("skill", functools.partial(skill_reply, out, msg, conn_keys, conn_opts)):
+                    await send_json(out, {"type": "system", "text": "⚠️ Still working on your earlier requests."})
 
             elif msg.get("type") == "final":  # user text
-                user_text = msg["text"]
-
-                # Gemini LLM response
-                async with httpx.AsyncClient(timeout=20) as client:
-                    gemini_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
-                    r = await client.post(
-                        gemini_url,
-                        params={"key": conn_keys["gemini"]},
-                        json={"contents": [{"parts": [{"text": user_text}]}]},
-                    )
-                    resp = r.json()
-                try:
-                    reply = resp["candidates"][0]["content"]["parts"][0]["text"]
-                except Exception as e:
-                    reply = f"⚠️ Gemini response error: {e}"
-
-                await ws.send_json({"type": "assistant", "text": reply})
-
-                # Murf TTS
-                if conn_keys["murf"]:
-                    try:
-                        tts_url = "https://api.murf.ai/v1/speech/generate"
-                        async with httpx.AsyncClient(timeout=30) as client:
-                            r = await client.post(
-                                tts_url,
-                                headers={
-                                    "api-key": conn_keys["murf"],  # ✅ correct header
-                                    "Content-Type": "application/json",
-                                },
-                                json={
-                                    "voiceId": "en-US-michelle",  # ✅ voice
-                                    "text": reply,
-                                    "format": "MP3",
-                                },
-                            )
-                        if r.status_code == 200:
-                            resp_json = r.json()
-                            audio_url = resp_json.get("audioFile")
-                            if audio_url:
-                                await ws.send_json({"type": "audio", "url": audio_url})
-                        else:
-                            logging.error(f"Murf error {r.status_code}: {r.text}")
-                    except Exception as e:
-                        logging.error(f"TTS error: {e}")
+                scheduler.start_turn("text", functools.partial(reply, out, msg["text"], conn_keys, conn_opts, memory))
+
+            if out.closed:
+                break
 
     except Exception as e:
         logging.error(f"WebSocket error: {e}")
     finally:
-        await ws.close()
+        metrics.WS_SESSIONS.dec()
+        for mic in list(mic_streams.values()):
+            await mic.abort()
+        await scheduler.close()
+        memory.close()
+        await out.close()
+        try:
+            await ws.close()
+        except Exception:
+            pass
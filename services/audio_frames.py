@@ -0,0 +1,71 @@
+# services/audio_frames.py
+"""
+Binary audio frames for /ws.
+
+Every binary WebSocket message is one frame:
+
+    byte 0      version (1)
+    byte 1      codec (see CODEC_*)
+    bytes 2-3   flags (big-endian, see FLAG_*)
+    bytes 4-7   stream id (big-endian uint32)
+    bytes 8-11  sequence number within the stream (big-endian uint32)
+    bytes 12-   raw audio payload
+
+JSON text messages keep carrying everything else (config, skills, transcripts).
+"""
+import struct
+from typing import NamedTuple, Tuple
+
+VERSION = 1
+HEADER = struct.Struct("!BBHII")
+HEADER_SIZE = HEADER.size
+
+CODEC_PCM16 = 0   # signed 16-bit little-endian mono PCM at 16 kHz (mic input)
+CODEC_MP3 = 1     # TTS output
+CODEC_WAV = 2
+CODEC_NAMES = {CODEC_PCM16: "pcm16", CODEC_MP3: "mp3", CODEC_WAV: "wav"}
+CODEC_BY_FORMAT = {"MP3": CODEC_MP3, "WAV": CODEC_WAV}
+
+FLAG_END_SEGMENT = 0x1  # last frame of one clip (e.g. one TTS sentence)
+FLAG_END_STREAM = 0x2   # last frame of the stream (end of utterance / end of turn audio)
+
+# TTS audio is sent in chunks of this size so playback can start before the clip is complete
+OUTBOUND_CHUNK_SIZE = 16 * 1024
+
+
+class FrameHeader(NamedTuple):
+    version: int
+    codec: int
+    flags: int
+    stream_id: int
+    seq: int
+
+
+class FrameError(ValueError):
+    pass
+
+
+def parse_frame(data: bytes) -> Tuple[FrameHeader, memoryview]:
+    """Split a binary message into its header and a zero-copy view of the payload."""
+    if len(data) < HEADER_SIZE:
+        raise FrameError(f"frame too short ({len(data)} bytes)")
+    header = FrameHeader(*HEADER.unpack_from(data))
+    if header.version != VERSION:
+        raise FrameError(f"unsupported frame version {header.version}")
+    return header, memoryview(data)[HEADER_SIZE:]
+
+
+def encode_frame(codec: int, stream_id: int, seq: int, payload, flags: int = 0) -> bytes:
+    return HEADER.pack(VERSION, codec, flags, stream_id, seq) + payload
+
+
+def iter_frames(data: bytes, codec: int, stream_id: int, first_seq: int = 0, final_flags: int = FLAG_END_SEGMENT):
+    """Chunk `data` into frames; `final_flags` is set on the last one."""
+    view = memoryview(data)
+    seq = first_seq
+    chunks = range(0, len(view), OUTBOUND_CHUNK_SIZE) or [0]
+    last = len(chunks) - 1
+    for i, offset in enumerate(chunks):
+        flags = final_flags if i == last else 0
+        yield encode_frame(codec, stream_id, seq, view[offset:offset + OUTBOUND_CHUNK_SIZE], flags)
+        seq += 1
@@ -0,0 +1,229 @@
+# services/connection.py
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, Set, Tuple
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Per-connection plumbing for /ws: a bounded outbound queue drained by one writer
+# task, and a scheduler that runs turns off the receive loop (one reply at a time,
+# replaced on barge-in) alongside a few independent background jobs such as skills.
+
+SEND_QUEUE_DEPTH = metrics.Gauge("byte_ws_send_queue_depth", "Messages waiting in /ws send queues, all connections")
+SLOW_CLIENTS = metrics.Counter("byte_ws_slow_clients_total", "Connections closed because their send queue stayed full")
+TURNS_CANCELLED = metrics.Counter("byte_turns_cancelled_total", "Turns interrupted by newer user input", ("kind",))
+BUSY_REJECTIONS = metrics.Counter("byte_background_rejected_total", "Background jobs refused at the per-connection limit")
+
+
+class SlowClientError(Exception):
+    pass
+
+
+class Outbox:
+    """Bounded send queue in front of a WebSocket; quacks like one for `send_text`/`send_bytes`.
+
+    Producers wait while `max_items` messages are queued, so a slow client holds at
+    most that many buffered messages. If no room frees up within `max_wait` seconds
+    the send raises `SlowClientError` and the socket is closed (code 1008), which
+    also ends the connection's receive loop. Messages are tagged
+    with the turn being traced when they were queued, so a cancelled turn's unsent
+    audio can be dropped with `drop_turn`.
+    """
+
+    def __init__(self, ws, max_items: int = 64, max_wait: float = 10.0):
+        self.ws = ws
+        self.max_items = max_items
+        self.max_wait = max_wait
+        self.closed = False
+        self._items: Deque[Tuple[Optional[metrics.TurnTrace], object]] = deque()
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._writer = asyncio.create_task(self._write())
+        self._closer: Optional[asyncio.Task] = None
+
+    async def _put(self, data):
+        while len(self._items) >= self.max_items:
+            if self.closed:
+                raise SlowClientError("connection closed")
+            self._space.clear()
+            try:
+                await asyncio.wait_for(self._space.wait(), self.max_wait)
+            except asyncio.TimeoutError:
+                SLOW_CLIENTS.inc()
+                self.close_now(code=1008)
+                raise SlowClientError(f"client did not read for {self.max_wait:g} s")
+        if self.closed:
+            raise SlowClientError("connection closed")
+        self._items.append((metrics.current_trace.get(), data))
+        SEND_QUEUE_DEPTH.inc()
+        self._ready.set()
+
+    async def send_text(self, text: str):
+        await self._put(text)
+
+    async def send_bytes(self, data: bytes):
+        await self._put(data)
+
+    def drop_turn(self, turn_id: str) -> int:
+        """Discard queued messages of a cancelled turn; returns how many were dropped."""
+        kept = deque(item for item in self._items if item[0] is None or item[0].turn_id != turn_id)
+        dropped = len(self._items) - len(kept)
+        self._items = kept
+        SEND_QUEUE_DEPTH.dec(amount=dropped)
+        self._space.set()
+        return dropped
+
+    async def _write(self):
+        try:
+            while True:
+                while not self._items:
+                    self._ready.clear()
+                    await self._ready.wait()
+                trace, data = self._items.popleft()
+                SEND_QUEUE_DEPTH.dec()
+                self._space.set()
+                start = time.perf_counter()
+                if isinstance(data, str):
+                    await self.ws.send_text(data)
+                    size = len(data.encode())
+                else:
+                    await self.ws.send_bytes(data)
+                    size = len(data)
+                seconds = time.perf_counter() - start
+                metrics.STAGE_SECONDS.observe(seconds, "ws_send")
+                if trace is not None:
+                    trace.spans.append(("ws_send", start, seconds))
+                metrics.WS_MESSAGES.inc("out")
+                metrics.WS_BYTES.inc("out", amount=size)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info("WebSocket send failed: %s", e)
+            self.close_now(code=1011)
+
+    def close_now(self, code: Optional[int] = None):
+        """Stop sending and wake blocked producers (they get SlowClientError).
+
+        With a `code`, the outbox is giving up on the client: the socket is closed
+        too, so a receive loop waiting on it sees the disconnect.
+        """
+        if code is not None and not self.closed:
+            self._closer = asyncio.create_task(self._close_socket(code))
+        self.closed = True
+        SEND_QUEUE_DEPTH.dec(amount=len(self._items))
+        self._items.clear()
+        self._space.set()
+        self._writer.cancel()
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.ws.close(code=code)
+        except Exception as e:
+            logger.debug("WebSocket close failed: %s", e)
+
+    async def close(self, flush_timeout: float = 2.0):
+        """Give queued messages a moment to go out, then stop the writer."""
+        deadline = time.monotonic() + flush_timeout
+        while self._items and not self._writer.done() and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        self.close_now()
+
+
+def new_turn_id() -> str:
+    return uuid.uuid4().hex[:8]
+
+
+TurnHandler = Callable[[metrics.TurnTrace], Awaitable[None]]
+
+
+class TurnScheduler:
+    """Runs a connection's turns as tasks so the receive loop keeps reading.
+
+    Replies are exclusive: `start_turn` cancels the reply in flight (barge-in),
+    waits for it to unwind (its LLM stream, TTS tasks and upstream connections
+    are released in their `finally` blocks), drops its unsent messages and tells
+    the client with {"type": "cancelled"}. `spawn` runs independent jobs such as
+    skills concurrently, at most `max_background` at a time.
+    """
+
+    def __init__(self, outbox: Outbox, max_background: int = 4):
+        self.outbox = outbox
+        self.max_background = max_background
+        self.current: Optional[asyncio.Task] = None
+        self.background: Set[asyncio.Task] = set()
+        self.closing = False
+
+    def start_turn(self, kind: str, handler: TurnHandler, start: Optional[float] = None):
+        if self.closing:
+            return
+        self.current = asyncio.create_task(self._run_turn(self.current, kind, handler, start))
+
+    def interrupt(self):
+        """Barge-in without a new turn yet (e.g. the user started speaking)."""
+        if self.current is not None and not self.current.done():
+            self.current.cancel()
+
+    async def _run_turn(self, previous: Optional[asyncio.Task], kind: str, handler: TurnHandler, start: Optional[float]):
+        if previous is not None and not previous.done():
+            previous.cancel()
+            await asyncio.wait([previous])
+        with metrics.turn(new_turn_id(), kind, start) as trace:
+            try:
+                await handler(trace)
+            except asyncio.CancelledError:
+                if self.closing:
+                    raise
+                TURNS_CANCELLED.inc(kind)
+                dropped = self.outbox.drop_turn(trace.turn_id)
+                logger.info("Turn %s cancelled (%s unsent messages dropped)", trace.turn_id, dropped)
+                await self._notify_cancelled(trace.turn_id)
+                raise
+            except SlowClientError:
+                pass
+            except Exception:
+                logger.exception("Turn %s failed", trace.turn_id)
+
+    async def _notify_cancelled(self, turn_id: str):
+        # queued untagged so drop_turn() doesn't catch it
+        token = metrics.current_trace.set(None)
+        try:
+            await self.outbox.send_text(f'{{"type":"cancelled","turn":"{turn_id}"}}')
+        except SlowClientError:
+            pass
+        finally:
+            metrics.current_trace.reset(token)
+
+    def spawn(self, kind: str, handler: TurnHandler) -> bool:
+        """Run `handler` as its own traced turn next to the current reply; False if at the limit."""
+        if self.closing:
+            return False
+        if len(self.background) >= self.max_background:
+            BUSY_REJECTIONS.inc()
+            return False
+        task = asyncio.create_task(self._run_background(kind, handler))
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+        return True
+
+    async def _run_background(self, kind: str, handler: TurnHandler):
+        with metrics.turn(new_turn_id(), kind) as trace:
+            try:
+                await handler(trace)
+            except SlowClientError:
+                pass
+            except Exception:
+                logger.exception("%s job failed", kind)
+
+    async def close(self):
+        self.closing = True
+        tasks = [t for t in [self.current, *self.background] if t is not None and not t.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
@@ -1,69 +1,291 @@
 # services/llm.py
+import asyncio
+import json
 import logging
-from typing import List, Dict, Any, Tuple
+import re
+import time
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple, Optional, AsyncIterator
 
-logger = logging.getLogger(__name__)
+import config
+from services import metrics, upstream
+from services.policy import ProviderUnavailable
+from services.router import router
 
-# optional imports - wrap to allow running if client not installed
-try:
-    import google.generativeai as genai
-    GENAI_AVAILABLE = True
-except Exception:
-    GENAI_AVAILABLE = False
+logger = logging.getLogger(__name__)
 
-# optional serpapi
-try:
-    from serpapi import GoogleSearch
-    SERP_AVAILABLE = True
-except Exception:
-    SERP_AVAILABLE = False
+GEMINI_BASE_URL = config.GEMINI_BASE_URL
+GEMINI_MODEL = "gemini-1.5-flash"
+SERPAPI_URL = f"{config.SERPAPI_BASE_URL}/search.json"
 
 SYSTEM_INSTRUCTIONS = """
 You are BYTE (Machine-based Assistant for Research, Voice, and Interactive Services).
 Be concise, slightly witty, and helpful. Keep replies short unless user requests long details.
 """
 
-def should_search_web(user_query: str, api_key: str) -> bool:
-    if not GENAI_AVAILABLE or not api_key:
-        return False
+# said instead of an answer while Gemini's circuit breaker is open (or it is saturated)
+FALLBACK_REPLY = "Sorry, my brain is a little overloaded right now. Give me a moment and ask again?"
+# said when a request fails; upstream error text stays in the logs (it is not for the user, TTS or the cache)
+ERROR_REPLY = "⚠️ Sorry, something went wrong while I was answering. Please try again."
+
+
+def user_turn(text: str) -> Dict[str, Any]:
+    return {"role": "user", "parts": [{"text": text}]}
+
+
+def model_turn(text: str) -> Dict[str, Any]:
+    return {"role": "model", "parts": [{"text": text}]}
+
+
+class GeminiModel:
+    """Thin REST client for Gemini `generateContent` on the shared upstream pool."""
+
+    def __init__(self, api_key: str, system_instruction: Optional[str] = None, model_name: str = GEMINI_MODEL):
+        self.api_key = api_key
+        self.system_instruction = system_instruction
+        self.url = f"{GEMINI_BASE_URL}/{model_name}:generateContent"
+        self.stream_url = f"{GEMINI_BASE_URL}/{model_name}:streamGenerateContent"
+        # the key goes in a header: query strings end up in error messages and logs
+        self._headers = {"x-goog-api-key": api_key}
+        self._system = {"parts": [{"text": system_instruction}]} if system_instruction else None
+
+    def _payload(self, contents: List[Dict[str, Any]]) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"contents": contents}
+        if self._system:
+            payload["systemInstruction"] = self._system
+        return payload
+
+    async def generate(self, contents: List[Dict[str, Any]], timeout: float = 20) -> str:
+        with metrics.span("llm"):
+            r = await upstream.post(self.url, provider="gemini", idempotent=True,
+                                  headers=self._headers, json=self._payload(contents), timeout=timeout)
+            upstream.raise_for_status(r, "gemini")
+            return r.json()["candidates"][0]["content"]["parts"][0]["text"]
+
+    async def stream(self, contents: List[Dict[str, Any]], timeout: float = 20) -> AsyncIterator[str]:
+        """Yield text deltas from `streamGenerateContent` (server-sent events)."""
+        start = time.perf_counter()
+        first = True
+        with metrics.span("llm"):
+            async with upstream.stream("POST", self.stream_url, provider="gemini", idempotent=True,
+                                       params={"alt": "sse"}, headers=self._headers,
+                                       json=self._payload(contents), timeout=timeout) as r:
+                if r.status_code != 200:
+                    await r.aread()
+                    upstream.raise_for_status(r, "gemini")
+                async for line in r.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    chunk = json.loads(line[5:])
+                    for cand in chunk.get("candidates", [])[:1]:
+                        for part in cand.get("content", {}).get("parts", []):
+                            if part.get("text"):
+                                if first:
+                                    metrics.record("llm_first_token", start)
+                                    first = False
+                                yield part["text"]
+
+
+@lru_cache(maxsize=128)
+def get_model(api_key: str, system_instruction: Optional[str] = None) -> GeminiModel:
+    """Shared GeminiModel per (api_key, system_instruction) instead of one per request."""
+    return GeminiModel(api_key, system_instruction=system_instruction)
+
+
+# sentence end: terminal punctuation (plus closing quotes/brackets) followed by whitespace, or a newline
+_SENTENCE_END = re.compile(r"(?<=[.!?…])[\"')\]]*\s+|\n+")
+
+
+class SentenceChunker:
+    """Cuts a token stream into sentences so each can go to TTS as soon as it completes.
+
+    Sentences shorter than `min_chars` are merged into the next one to avoid
+    a flood of tiny TTS requests ("Sure!", "Hmm.").
+    """
+
+    def __init__(self, min_chars: int = 24):
+        self.min_chars = min_chars
+        self.buf = ""
+
+    def feed(self, delta: str) -> List[str]:
+        self.buf += delta
+        out = []
+        start = 0
+        for m in _SENTENCE_END.finditer(self.buf):
+            sentence = self.buf[start:m.end()].strip()
+            if len(sentence) < self.min_chars:
+                continue
+            out.append(sentence)
+            start = m.end()
+        self.buf = self.buf[start:]
+        return out
+
+    def flush(self) -> str:
+        tail, self.buf = self.buf.strip(), ""
+        return tail
+
+
+async def _remote_should_search(user_query: str, api_key: str) -> Optional[bool]:
+    """Gemini's yes/no verdict, or None when it couldn't give one."""
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel("gemini-1.5-flash")
         prompt = f"Answer with 'yes' or 'no' only. Does the following query require a web search to answer accurately? Query: {user_query}"
-        resp = model.generate_content(prompt)
-        return resp.text.strip().lower().startswith("yes")
-    except Exception as e:
+        with metrics.span("route"):
+            text = await get_model(api_key).generate([user_turn(prompt)])
+        return text.strip().lower().startswith("yes")
+    except ProviderUnavailable as e:
+        logger.warning("should_search_web skipped: %s", e)
+        return None
+    except Exception:
         logger.exception("should_search_web failed")
+        return None
+
+async def should_search_web(user_query: str, api_key: str) -> bool:
+    # local rules/classifier first; Gemini is only asked when they aren't sure
+    decision = router.decide(user_query)
+    if decision is not None:
+        return decision
+    if not api_key:
         return False
+    needs_search = await _remote_should_search(user_query, api_key)
+    if needs_search is None:
+        return False  # a failed check is not a verdict; ask again next time
+    router.remember(user_query, needs_search)
+    return needs_search
+
+async def stream_llm_response(user_query: str, history: List[Dict[str, Any]], api_key: str) -> AsyncIterator[str]:
+    """Yield reply text deltas as Gemini produces them. Errors propagate to the caller."""
+    # fallback if no gemini key
+    if not api_key:
+        yield f"I can't access Gemini here. Echo: {user_query}"
+        return
+    model = get_model(api_key, SYSTEM_INSTRUCTIONS)
+    async for delta in model.stream(history + [user_turn(user_query)]):
+        yield delta
 
-def get_llm_response(user_query: str, history: List[Dict[str, Any]], api_key: str) -> Tuple[str, List[Dict[str, Any]]]:
-    # fallback if gemini not installed
-    if not GENAI_AVAILABLE or not api_key:
-        fallback = f"I can't access Gemini here. Echo: {user_query}"
-        return fallback, history
+async def get_llm_response(user_query: str, history: List[Dict[str, Any]], api_key: str) -> Tuple[str, List[Dict[str, Any]]]:
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel("gemini-1.5-flash", system_instruction=SYSTEM_INSTRUCTIONS)
-        chat = model.start_chat(history=history)
-        resp = chat.send_message(user_query)
-        return resp.text, chat.history
-    except Exception as e:
+        text = "".join([delta async for delta in stream_llm_response(user_query, history, api_key)])
+        return text, history + [user_turn(user_query), model_turn(text)]
+    except ProviderUnavailable as e:
+        logger.warning("LLM skipped: %s", e)
+        return FALLBACK_REPLY, history
+    except Exception:
         logger.exception("LLM request failed")
-        return f"LLM error: {e}", history
+        return ERROR_REPLY, history
 
-def get_web_response(user_query: str, history: List[Dict[str, Any]], gemini_api_key: str, serp_api_key: str) -> Tuple[str, List[Dict[str, Any]]]:
-    if not SERP_AVAILABLE or not serp_api_key:
-        return "Web search not available (SerpAPI missing).", history
+async def summarize_turns(previous_summary: str, turns, api_key: str) -> str:
+    """Fold evicted conversation turns (services.memory.Turn) into a short running summary."""
+    if not api_key:
+        return previous_summary
+    transcript = "\n".join(f"{t.role}: {t.text}" for t in turns)
+    prompt = (
+        "Update the summary of a conversation between a user and an assistant. "
+        "Keep names, facts and open questions; at most 80 words.\n\n"
+        f"Current summary: {previous_summary or '(none)'}\n\nNew turns:\n{transcript}"
+    )
+    return await get_model(api_key).generate([user_turn(prompt)])
+
+async def search_context(user_query: str, serp_api_key: str) -> str:
+    params = {"q": user_query, "engine": "google", "api_key": serp_api_key}
+    with metrics.span("search"):
+        # SerpAPI only takes its key as a query parameter, so never let httpx format this URL into an error
+        r = await upstream.get(SERPAPI_URL, provider="serpapi", params=params, timeout=15)
+        upstream.raise_for_status(r, "serpapi")
+    res = r.json()
+    snippets = []
+    for item in res.get("organic_results", [])[:5]:
+        snippets.append(item.get("snippet") or item.get("title") or "")
+    return "\n".join(snippets)
+
+def web_prompt(user_query: str, context: str) -> str:
+    return f"Use the search results below to answer concisely. Query: {user_query}\n\nContext:\n{context}"
+
+_END = object()
+
+async def _pump(deltas: AsyncIterator[str], queue: asyncio.Queue):
     try:
-        params = {"q": user_query, "engine": "google", "api_key": serp_api_key}
-        s = GoogleSearch(params)
-        res = s.get_dict()
-        snippets = []
-        for r in res.get("organic_results", [])[:5]:
-            snippets.append(r.get("snippet") or r.get("title") or "")
-        context = "\n".join(snippets)
-        prompt = f"Use the search results below to answer concisely. Query: {user_query}\n\nContext:\n{context}"
-        return get_llm_response(prompt, history, gemini_api_key)
+        async for delta in deltas:
+            queue.put_nowait(delta)
+        queue.put_nowait(_END)
     except Exception as e:
+        queue.put_nowait(e)
+
+def _discard(task: asyncio.Task):
+    task.cancel()
+    if task.done() and not task.cancelled():
+        task.exception()  # mark retrieved
+
+async def _stream_with_search(user_query: str, history: List[Dict[str, Any]], api_key: str, context_task) -> AsyncIterator[str]:
+    try:
+        prompt = web_prompt(user_query, await context_task)
+    except Exception:
+        logger.exception("Web search failed; answering directly")
+        prompt = user_query
+    async for delta in stream_llm_response(prompt, history, api_key):
+        yield delta
+
+async def stream_routed_response(user_query: str, history: List[Dict[str, Any]], gemini_api_key: str, serp_api_key: str) -> AsyncIterator[str]:
+    """
+    Like stream_llm_response, but grounds the answer in web results when the query needs them.
+    When the local router is unsure, the direct answer, the Gemini yes/no check and the web
+    search all start at once; whichever branch loses is cancelled.
+    """
+    if not serp_api_key or not gemini_api_key:
+        decision = False
+    else:
+        decision = router.decide(user_query)
+
+    if decision is False:
+        async for delta in stream_llm_response(user_query, history, gemini_api_key):
+            yield delta
+        return
+    if decision is True:
+        async for delta in _stream_with_search(user_query, history, gemini_api_key, search_context(user_query, serp_api_key)):
+            yield delta
+        return
+
+    verdict = asyncio.create_task(_remote_should_search(user_query, gemini_api_key))
+    context = asyncio.create_task(search_context(user_query, serp_api_key))
+    direct_q: asyncio.Queue = asyncio.Queue()
+    direct = asyncio.create_task(_pump(stream_llm_response(user_query, history, gemini_api_key), direct_q))
+    try:
+        needs_search = await verdict
+        if needs_search is not None:  # a failed check is not a verdict; ask again next time
+            router.remember(user_query, needs_search)
+        if needs_search:
+            _discard(direct)
+            async for delta in _stream_with_search(user_query, history, gemini_api_key, context):
+                yield delta
+        else:
+            _discard(context)
+            while True:
+                item = await direct_q.get()
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+    finally:
+        for task in (verdict, context, direct):
+            _discard(task)
+
+async def get_routed_response(user_query: str, history: List[Dict[str, Any]], gemini_api_key: str, serp_api_key: str) -> Tuple[str, List[Dict[str, Any]]]:
+    try:
+        text = "".join([delta async for delta in stream_routed_response(user_query, history, gemini_api_key, serp_api_key)])
+        return text, history + [user_turn(user_query), model_turn(text)]
+    except ProviderUnavailable as e:
+        logger.warning("LLM skipped: %s", e)
+        return FALLBACK_REPLY, history
+    except Exception:
+        logger.exception("LLM request failed")
+        return ERROR_REPLY, history
+
+async def get_web_response(user_query: str, history: List[Dict[str, Any]], gemini_api_key: str, serp_api_key: str) -> Tuple[str, List[Dict[str, Any]]]:
+    if not serp_api_key:
+        return "Web search not available (SerpAPI key missing).", history
+    try:
+        context = await search_context(user_query, serp_api_key)
+        return await get_llm_response(web_prompt(user_query, context), history, gemini_api_key)
+    except Exception:
         logger.exception("Web response failed")
-        return f"Web search error: {e}", history
+        return ERROR_REPLY, history
@@ -0,0 +1,136 @@
+# services/memory.py
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+DROPPED_TURNS = metrics.Counter("byte_memory_turns_dropped_total",
+                                "Evicted turns discarded before they reached the summary", ("reason",))
+
+# summarizer(previous_summary, evicted_turns) -> new summary text
+Summarizer = Callable[[str, List["Turn"]], Awaitable[str]]
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English, plus a little per-message overhead
+    return len(text) // 4 + 4
+
+
+class Turn:
+    __slots__ = ("role", "text", "tokens", "content")
+
+    def __init__(self, role: str, text: str):
+        self.role = role
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        # request-ready Gemini content, built once and reused for every later prompt
+        self.content = {"role": role, "parts": [{"text": text}]}
+
+
+class ConversationMemory:
+    """Per-connection chat history held under a token budget.
+
+    The running token total is updated on every add/evict, so checking the
+    budget never rescans history. When a new turn pushes the total over
+    `token_budget`, the oldest user/model pairs are evicted right away (RAM and
+    prompt size stay bounded); with a `summarizer`, the evicted turns are folded
+    into a running summary in a background task and sent ahead of the history.
+    """
+
+    def __init__(self, token_budget: int = 2000, summarizer: Optional[Summarizer] = None):
+        self.token_budget = token_budget
+        self.summarizer = summarizer
+        self.turns: Deque[Turn] = deque()
+        self.tokens = 0
+        self.summary = ""
+        self._summary_turns: List[Turn] = []
+        self._evicted: Deque[Turn] = deque()
+        self._evicted_tokens = 0
+        self.dropped_turns = 0  # evicted turns that never made it into the summary
+        self._summarizing: Optional[asyncio.Task] = None
+
+    def add(self, role: str, text: str):
+        turn = Turn(role, text)
+        self.turns.append(turn)
+        self.tokens += turn.tokens
+        if self.tokens > self.token_budget:
+            self._evict()
+
+    def add_exchange(self, user_text: str, model_text: str):
+        self.add("user", user_text)
+        self.add("model", model_text)
+
+    def _evict(self):
+        # keep the latest exchange even if it alone is over budget
+        while self.tokens > self.token_budget and len(self.turns) > 2:
+            turn = self.turns.popleft()
+            self.tokens -= turn.tokens
+            self._hold(turn)
+            # drop in user/model pairs so history still starts with a user turn
+            if self.turns and self.turns[0].role == "model":
+                turn = self.turns.popleft()
+                self.tokens -= turn.tokens
+                self._hold(turn)
+        if self.summarizer is None:
+            self._take_evicted()  # nothing to fold them into; evicted turns are simply forgotten
+            return
+        # only hold on to as much evicted text as one budget's worth
+        dropped = 0
+        while self._evicted_tokens > self.token_budget:
+            self._evicted_tokens -= self._evicted.popleft().tokens
+            dropped += 1
+        if dropped:
+            self._dropped(dropped, "backlog")
+        if self._evicted and (self._summarizing is None or self._summarizing.done()):
+            self._summarizing = asyncio.create_task(self._summarize())
+
+    def _hold(self, turn: Turn):
+        self._evicted.append(turn)
+        self._evicted_tokens += turn.tokens
+
+    def _take_evicted(self) -> List[Turn]:
+        batch = list(self._evicted)
+        self._evicted.clear()
+        self._evicted_tokens = 0
+        return batch
+
+    def _dropped(self, count: int, reason: str):
+        self.dropped_turns += count
+        DROPPED_TURNS.inc(reason, amount=count)
+        logger.warning("Conversation memory dropped %d evicted turns (%s)", count, reason)
+
+    async def _summarize(self):
+        while self._evicted:
+            batch = self._take_evicted()
+            try:
+                summary = (await self.summarizer(self.summary, batch)).strip()
+            except Exception:
+                logger.exception("Conversation summary failed")
+                self._dropped(len(batch), "summary_failed")
+                continue
+            self._set_summary(summary)
+
+    def _set_summary(self, summary: str):
+        for turn in self._summary_turns:
+            self.tokens -= turn.tokens
+        self.summary = summary
+        self._summary_turns = [
+            Turn("user", f"Summary of our earlier conversation: {summary}"),
+            Turn("model", "Got it."),
+        ] if summary else []
+        for turn in self._summary_turns:
+            self.tokens += turn.tokens
+        if self.tokens > self.token_budget:
+            self._evict()
+
+    def contents(self) -> List[Dict[str, Any]]:
+        """History in Gemini `contents` form, summary first."""
+        return [t.content for t in self._summary_turns] + [t.content for t in self.turns]
+
+    def close(self):
+        if self._summarizing is not None:
+            self._summarizing.cancel()
@@ -0,0 +1,233 @@
+# services/metrics.py
+import math
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+# In-process counters/gauges/histograms rendered in the Prometheus text format,
+# plus per-turn traces. Everything runs on the event loop, so there is no locking;
+# recording a value is a dict lookup and a couple of additions.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        _registry.append(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in self.values.items()]
+
+
+class Gauge(_Metric):
+    """Set directly, or computed at scrape time by `fn` (keeps queue depths etc. off the hot path)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), fn: Optional[Callable[[], float]] = None):
+        super().__init__(name, help, labels)
+        self.values: Dict[Tuple, float] = {}
+        self.fn = fn
+
+    def set(self, value: float, *labels):
+        self.values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def render(self) -> List[str]:
+        if self.fn is not None:
+            return [f"{self.name} {_num(self.fn())}"]
+        return [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in self.values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self.values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="%s"' % _num(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total!r}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class StatsCollector(_Metric):
+    """Exposes a component's `stats()` dict (e.g. cache hit counts) as `<prefix>_<key>` samples."""
+
+    def __init__(self, prefix: str, help: str, stats: Callable[[], Dict[str, float]]):
+        super().__init__(prefix, help)
+        self.stats = stats
+
+    def header(self) -> List[str]:
+        return []
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, value in self.stats().items():
+            name = f"{self.name}_{key}"
+            lines += [f"# HELP {name} {self.help}: {key}", f"# TYPE {name} untyped", f"{name} {_num(value)}"]
+        return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines += metric.header()
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+# ---------------- shared metrics ---------------- #
+STAGE_SECONDS = Histogram("byte_stage_seconds", "Latency of each pipeline stage", ("stage",))
+STAGE_ERRORS = Counter("byte_stage_errors_total", "Pipeline stages that raised", ("stage",))
+TURNS = Counter("byte_turns_total", "Turns answered, by input kind", ("kind",))
+TURN_SECONDS = Histogram("byte_turn_seconds", "End-to-end turn latency, by input kind", ("kind",))
+UPSTREAM_REQUESTS = Counter("byte_upstream_requests_total", "Upstream HTTP responses by provider and status", ("provider", "status"))
+UPSTREAM_SECONDS = Histogram("byte_upstream_request_seconds", "Upstream HTTP latency (to response headers)", ("provider",))
+UPSTREAM_BYTES = Counter("byte_upstream_bytes_total", "Upstream HTTP body bytes", ("provider", "direction"))
+WS_BYTES = Counter("byte_ws_bytes_total", "WebSocket payload bytes", ("direction",))
+WS_MESSAGES = Counter("byte_ws_messages_total", "WebSocket messages", ("direction",))
+WS_SESSIONS = Gauge("byte_ws_sessions_active", "Open /ws connections")
+
+
+# ---------------- per-turn tracing ---------------- #
+class TurnTrace:
+    """Spans recorded while answering one turn (offsets are relative to `start`)."""
+
+    __slots__ = ("turn_id", "kind", "start", "spans", "marks")
+
+    def __init__(self, turn_id: str, kind: str, start: Optional[float] = None):
+        self.turn_id = turn_id
+        self.kind = kind
+        self.start = time.perf_counter() if start is None else start
+        self.spans: List[Tuple[str, float, float]] = []  # (stage, start, seconds)
+        self.marks: Dict[str, float] = {}
+
+    def mark(self, name: str):
+        """Record the first time `name` happens in this turn (e.g. first token, first audio)."""
+        if name not in self.marks:
+            self.marks[name] = time.perf_counter() - self.start
+
+    def summary(self) -> Dict:
+        stages: Dict[str, Dict[str, float]] = {}
+        for stage, start, seconds in self.spans:
+            s = stages.get(stage)
+            if s is None:
+                s = stages[stage] = {"count": 0, "total_ms": 0.0, "first_ms": round((start - self.start) * 1000, 1)}
+            s["count"] += 1
+            s["total_ms"] += seconds * 1000
+        for s in stages.values():
+            s["total_ms"] = round(s["total_ms"], 1)
+        return {
+            "turn": self.turn_id,
+            "kind": self.kind,
+            "total_ms": round((time.perf_counter() - self.start) * 1000, 1),
+            "marks_ms": {k: round(v * 1000, 1) for k, v in self.marks.items()},
+            "stages": stages,
+        }
+
+
+# tasks spawned while a turn is active (TTS, speculative LLM calls) inherit it
+current_trace: ContextVar[Optional[TurnTrace]] = ContextVar("current_trace", default=None)
+
+
+def record(stage: str, start: float, end: Optional[float] = None):
+    """Record a finished span that started at `start` (a time.perf_counter() value)."""
+    seconds = (time.perf_counter() if end is None else end) - start
+    STAGE_SECONDS.observe(seconds, stage)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.spans.append((stage, start, seconds))
+
+
+@contextmanager
+def span(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage)
+        raise
+    finally:
+        record(stage, start)
+
+
+def mark(name: str):
+    trace = current_trace.get()
+    if trace is not None:
+        trace.mark(name)
+
+
+@contextmanager
+def turn(turn_id: str, kind: str, start: Optional[float] = None):
+    """Make a new TurnTrace current for the enclosed code and count the turn when it ends."""
+    trace = TurnTrace(turn_id, kind, start)
+    token = current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        current_trace.reset(token)
+        TURNS.inc(kind)
+        TURN_SECONDS.observe(time.perf_counter() - trace.start, kind)
@@ -0,0 +1,252 @@
+# services/policy.py
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager, nullcontext
+from dataclasses import dataclass, replace
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import config
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Per-provider admission control and failure handling for upstream calls:
+# a concurrency semaphore and token bucket (waiting longer than `admission_timeout`
+# sheds the call), retries with jittered exponential backoff for idempotent calls,
+# and a circuit breaker that fails fast while a provider is down so callers can
+# fall back immediately instead of waiting out their timeouts.
+
+INFLIGHT = metrics.Gauge("byte_upstream_inflight", "Upstream calls holding a concurrency slot", ("provider",))
+ADMISSION_SECONDS = metrics.Histogram("byte_upstream_admission_seconds", "Time waiting for a concurrency slot / rate token",
+                                      ("provider",), buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+RETRIES = metrics.Counter("byte_upstream_retries_total", "Upstream calls retried, by reason", ("provider", "reason"))
+REJECTED = metrics.Counter("byte_upstream_rejected_total", "Upstream calls refused locally (breaker open / overloaded)", ("provider", "reason"))
+BREAKER_STATE = metrics.Gauge("byte_upstream_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ("provider",))
+
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+_STATE_NAMES = {CLOSED: "closed", HALF_OPEN: "half-open", OPEN: "open"}
+
+
+class ProviderUnavailable(Exception):
+    """Raised without calling the provider: its breaker is open or it is saturated."""
+
+    def __init__(self, provider: str, reason: str):
+        super().__init__(f"{provider} is temporarily unavailable ({reason})")
+        self.provider = provider
+        self.reason = reason
+
+
+@dataclass(frozen=True)
+class PolicyConfig:
+    concurrency: int = 32          # calls in flight at once
+    rate: float = 0.0              # calls per second (0 = unlimited)
+    burst: int = 10                # token bucket size
+    retries: int = 2               # extra attempts for idempotent calls
+    backoff: float = 0.2           # first backoff (s); doubles per attempt, full jitter
+    backoff_max: float = 2.0
+    failures: int = 5              # consecutive failures that open the breaker
+    reset: float = 15.0            # seconds open before a half-open probe
+    admission_timeout: float = 5.0
+
+
+_FIELDS = {"concurrency": int, "rate": float, "burst": int, "retries": int, "backoff": float,
+           "backoff_max": float, "failures": int, "reset": float, "admission_timeout": float}
+
+
+def parse_overrides(spec: str) -> Dict[str, Dict[str, Any]]:
+    """'gemini:concurrency=8,rate=5;murf:retries=1' -> {"gemini": {...}, "murf": {...}}"""
+    out: Dict[str, Dict[str, Any]] = {}
+    for block in filter(None, (b.strip() for b in spec.split(";"))):
+        name, _, opts = block.partition(":")
+        for item in filter(None, opts.split(",")):
+            key, _, value = item.partition("=")
+            key = key.strip()
+            if key not in _FIELDS:
+                raise ValueError(f"unknown upstream policy option {key!r} for {name}")
+            out.setdefault(name.strip(), {})[key] = _FIELDS[key](value)
+    return out
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def wait_time(self) -> float:
+        """Take a token if one is available (0.0), else return how long until one is."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class CircuitBreaker:
+    """Opens after `failures` consecutive failures; after `reset` seconds lets one probe through."""
+
+    def __init__(self, provider: str, failures: int, reset: float):
+        self.provider = provider
+        self.threshold = failures
+        self.reset = reset
+        self.state = CLOSED
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self.probing = False
+        BREAKER_STATE.set(CLOSED, provider)
+
+    def _transition(self, state: int):
+        if state != self.state:
+            log = logger.warning if state == OPEN else logger.info
+            log("Circuit breaker for %s: %s -> %s", self.provider, _STATE_NAMES[self.state], _STATE_NAMES[state])
+            self.state = state
+            BREAKER_STATE.set(state, self.provider)
+
+    def allow(self) -> bool:
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset:
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self.probing:
+                return False
+            self.probing = True
+        return self.state != OPEN
+
+    def success(self):
+        self.consecutive = 0
+        self.probing = False
+        self._transition(CLOSED)
+
+    def release(self):
+        """The call ended without telling us anything about the provider (cancelled, throttled...)."""
+        self.probing = False
+
+    def failure(self):
+        self.consecutive += 1
+        self.probing = False
+        if self.state == HALF_OPEN or self.consecutive >= self.threshold:
+            self.opened_at = time.monotonic()
+            self._transition(OPEN)
+
+
+# check(result) -> None if the result is fine, else (reason, retry_after or None)
+ResultCheck = Callable[[Any], Optional[Tuple[str, Optional[float]]]]
+
+
+class ProviderPolicy:
+    def __init__(self, provider: str, cfg: PolicyConfig):
+        self.provider = provider
+        self.cfg = cfg
+        self._slots = asyncio.Semaphore(cfg.concurrency)
+        self._bucket = TokenBucket(cfg.rate, cfg.burst) if cfg.rate > 0 else None
+        self.breaker = CircuitBreaker(provider, cfg.failures, cfg.reset)
+
+    def check_breaker(self):
+        if not self.breaker.allow():
+            REJECTED.inc(self.provider, "breaker_open")
+            raise ProviderUnavailable(self.provider, "circuit open")
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold a concurrency slot (and a rate token) for the enclosed call."""
+        start = time.monotonic()
+        deadline = start + self.cfg.admission_timeout
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.cfg.admission_timeout)
+        except asyncio.TimeoutError:
+            REJECTED.inc(self.provider, "concurrency")
+            raise ProviderUnavailable(self.provider, "too many requests in flight") from None
+        try:
+            while self._bucket is not None:
+                wait = self._bucket.wait_time()
+                if not wait:
+                    break
+                if time.monotonic() + wait > deadline:
+                    REJECTED.inc(self.provider, "rate_limit")
+                    raise ProviderUnavailable(self.provider, "rate limit")
+                await asyncio.sleep(wait)
+            ADMISSION_SECONDS.observe(time.monotonic() - start, self.provider)
+            INFLIGHT.inc(self.provider)
+            try:
+                yield
+            finally:
+                INFLIGHT.dec(self.provider)
+        finally:
+            self._slots.release()
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        delay = random.uniform(0, min(self.cfg.backoff_max, self.cfg.backoff * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.cfg.backoff_max))
+        return delay
+
+    async def run(self, attempt: Callable[[], Awaitable[Any]], retry: bool = False, check: Optional[ResultCheck] = None,
+                  transient: Tuple[type, ...] = (Exception,), admitted: bool = False) -> Any:
+        """Call `attempt` under this policy.
+
+        Exceptions of the `transient` types, and results that `check` flags, count
+        as failures: they are retried (if `retry`) and feed the breaker. A flagged
+        result is returned as-is once retries run out; exceptions are re-raised.
+        Failures flagged as "throttled" back off but don't trip the breaker.
+        With `admitted`, the caller already holds a slot from `admit()` (e.g. for a stream).
+        """
+        attempts = 1 + (self.cfg.retries if retry else 0)
+        for n in range(attempts):
+            self.check_breaker()
+            error, retry_after = None, None
+            try:
+                async with (nullcontext() if admitted else self.admit()):
+                    result = await attempt()
+            except ProviderUnavailable:
+                self.breaker.release()
+                raise
+            except transient as e:
+                error, reason = e, type(e).__name__
+            except BaseException:
+                self.breaker.release()
+                raise
+            else:
+                flagged = check(result) if check else None
+                if flagged is None:
+                    self.breaker.success()
+                    return result
+                reason, retry_after = flagged
+            if reason == "throttled":
+                self.breaker.release()
+            else:
+                self.breaker.failure()
+            if n + 1 >= attempts:
+                if error is not None:
+                    raise error
+                return result
+            RETRIES.inc(self.provider, reason)
+            delay = self.backoff(n, retry_after)
+            logger.info("%s call failed (%s); retry %d/%d in %.2f s", self.provider, reason, n + 1, attempts - 1, delay)
+            await asyncio.sleep(delay)
+
+
+DEFAULTS = {
+    "gemini": PolicyConfig(concurrency=32, rate=50, burst=100),
+    "murf": PolicyConfig(concurrency=16, rate=30, burst=60),
+    "murf_audio": PolicyConfig(concurrency=32),
+    "newsapi": PolicyConfig(concurrency=4, rate=1, burst=5),
+    "openweather": PolicyConfig(concurrency=8, rate=1, burst=10),
+    "serpapi": PolicyConfig(concurrency=8, rate=2, burst=5),
+    # the SDK already retries transient connects, so only admission and the breaker apply
+    "assemblyai": PolicyConfig(concurrency=8, retries=0),
+}
+
+_overrides = parse_overrides(config.UPSTREAM_POLICY)
+_policies: Dict[str, ProviderPolicy] = {}
+
+
+def get(provider: str) -> ProviderPolicy:
+    policy = _policies.get(provider)
+    if policy is None:
+        cfg = replace(DEFAULTS.get(provider, PolicyConfig()), **_overrides.get(provider, {}))
+        policy = _policies[provider] = ProviderPolicy(provider, cfg)
+    return policy
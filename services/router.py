@@ -0,0 +1,109 @@
+# services/router.py
+import math
+import re
+from collections import OrderedDict
+from typing import Optional
+
+# Local search/no-search routing, so most queries don't need an extra LLM round trip.
+# decide() returns True (search), False (answer directly) or None (not sure).
+
+# explicit requests to search, checked first: they override the direct-answer rules
+# ("search the web for a poem about ..."); only unambiguous phrasings belong here
+_EXPLICIT_RULES = [
+    re.compile(r"\b(search (the web |online |google )?for|search (the web|online|google)|look (it |that |this )?up|google (it|that|this|for))\b"),
+    re.compile(r"^\s*google\b"),
+]
+_DIRECT_RULES = [
+    re.compile(r"^\s*(hi|hello|hey|thanks|thank you|ok(ay)?|bye|good (morning|evening|night))\b[\s!.?]*$"),
+    re.compile(r"\b(how are you|how's it going|how have you been|what's up|nice to meet you)\b"),  # small talk
+    re.compile(r"^[\d\s+\-*/().^%=x]+\??$"),  # arithmetic
+    re.compile(r"\b(write|compose|draft) (me )?(a|an|the)? ?(poem|story|song|haiku|email|letter|essay)\b"),
+    re.compile(r"\b(tell me a joke|joke about|translate|rephrase|summari[sz]e this|explain like)\b"),
+    re.compile(r"\b(who are you|your name|what can you do)\b"),
+    # actual code in the query, not just a language or keyword mentioned in passing
+    re.compile(r"```|\b(def|function) \w+ ?\(|\bclass \w+ ?[(:{]"),
+]
+# freshness words and live topics: they outrank the classifier, not the direct-answer rules
+_SEARCH_RULES = [
+    re.compile(r"\b(latest|breaking|recent(ly)?|currently|current (events|affairs|price|status|version|president|ceo|champion)|today'?s?|tonight|this (week|month|year)|yesterday|tomorrow|right now|as of|near me)\b"),
+    re.compile(r"\b(news|headlines?|stock|share price|price of|exchange rate|score|standings|fixtures?|weather|forecast)\b"),
+    re.compile(r"\b(who (won|is winning)|when (is|does|will) .* (release|start|open)|released? (date|on))\b"),
+    re.compile(r"\b20[2-9]\d\b"),
+]
+
+# tiny linear classifier (log-odds per token) for whatever the rules don't catch
+_BIAS = -0.8
+_WEIGHTS = {
+    "price": 1.6, "cost": 0.8, "release": 1.2, "released": 1.2, "election": 1.8, "president": 1.0,
+    "ceo": 1.2, "population": 0.9, "open": 0.4, "hours": 0.9, "near": 1.3, "schedule": 1.2,
+    "match": 0.9, "game": 0.5, "update": 1.0, "version": 0.8, "new": 0.7, "now": 1.0, "happened": 1.1,
+    "who": 0.4, "when": 0.5, "where": 0.6, "how much": 1.0, "review": 0.8, "best": 0.5,
+    "explain": -1.6, "why": -0.8, "how": -0.4, "what is": -0.5, "define": -1.5, "meaning": -1.2,
+    "difference": -1.0, "example": -1.1, "idea": -1.2, "ideas": -1.2, "advice": -1.2, "should": -0.6,
+    "help": -0.6, "opinion": -1.2, "think": -0.8, "history": -0.4, "theory": -1.2, "formula": -1.3,
+}
+_TOKEN_RE = re.compile(r"how much|what is|[a-z0-9']+")
+
+SEARCH_ABOVE = 0.75
+DIRECT_BELOW = 0.30
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def search_probability(query: str) -> float:
+    score = _BIAS + sum(_WEIGHTS.get(tok, 0.0) for tok in _TOKEN_RE.findall(query))
+    return 1 / (1 + math.exp(-score))
+
+
+def classify(query: str) -> Optional[bool]:
+    """Rules first, then the linear model; None when neither is confident."""
+    for rule in _EXPLICIT_RULES:
+        if rule.search(query):
+            return True
+    for rule in _DIRECT_RULES:
+        if rule.search(query):
+            return False
+    for rule in _SEARCH_RULES:
+        if rule.search(query):
+            return True
+    p = search_probability(query)
+    if p >= SEARCH_ABOVE:
+        return True
+    if p <= DIRECT_BELOW:
+        return False
+    return None
+
+
+class Router:
+    """LRU of routing decisions; remote verdicts for unsure queries are remembered too."""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._decisions: "OrderedDict[str, Optional[bool]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def decide(self, query: str) -> Optional[bool]:
+        key = normalize_query(query)
+        if key in self._decisions:
+            self._decisions.move_to_end(key)
+            self.hits += 1
+            return self._decisions[key]
+        self.misses += 1
+        decision = classify(key)
+        self._store(key, decision)
+        return decision
+
+    def remember(self, query: str, needs_search: bool):
+        self._store(normalize_query(query), needs_search)
+
+    def _store(self, key: str, decision: Optional[bool]):
+        self._decisions[key] = decision
+        self._decisions.move_to_end(key)
+        while len(self._decisions) > self.max_entries:
+            self._decisions.popitem(last=False)
+
+
+router = Router()
@@ -0,0 +1,50 @@
+# services/singleflight.py
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+# result handed to followers when the leader was cancelled: one of them runs `fn` instead
+_ABANDONED = object()
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one in-flight coroutine.
+
+    The first caller runs `fn`; callers arriving while it is running await the
+    same result (or exception). Followers are shielded, so one of them being
+    cancelled does not cancel the shared call; if the leader is cancelled instead
+    (e.g. its turn was interrupted), a waiting follower takes over and runs `fn`.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        fut = self._calls.get(key)
+        while fut is not None:
+            # a CancelledError here is always this follower's own cancellation
+            result = await asyncio.shield(fut)
+            if result is not _ABANDONED:
+                return result
+            fut = self._calls.get(key)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._calls[key] = fut
+        try:
+            result = await fn()
+            fut.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            fut.set_result(_ABANDONED)
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved so an unwaited failure doesn't log a warning
+            raise
+        finally:
+            self._calls.pop(key, None)
@@ -0,0 +1,98 @@
+# services/skill_cache.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Set, Tuple
+
+from services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class SkillCache:
+    """TTL cache for skill results with stale-while-revalidate and single-flight fetches.
+
+    - fresh entry (age < ttl): returned as is
+    - stale entry (age < ttl + stale_ttl): returned immediately, refreshed in the background
+    - missing/expired: fetched once, however many callers are waiting on it
+
+    Only successful results are cached; if `fetch` raises, the error goes to the
+    callers and the previous entry (if any) stays in place. Errors listed in
+    `fallback_on` (e.g. the provider's circuit breaker is open) are answered with
+    that previous entry instead, however old.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()  # key -> (fetched_at, value)
+        self._flight = SingleFlight()
+        self._refreshes: Set[asyncio.Task] = set()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refresh_errors = 0
+        self.fallbacks = 0
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], ttl: float, stale_ttl: float = 0,
+                  fallback_on: Tuple[type, ...] = ()) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            fetched_at, value = entry
+            age = time.monotonic() - fetched_at
+            if age < ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            if age < ttl + stale_ttl:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                self._refresh(key, fetch)
+                return value
+
+        if key in self._flight:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        try:
+            return await self._flight.do(key, lambda: self._fetch(key, fetch))
+        except fallback_on as e:
+            if entry is None:
+                raise
+            self.fallbacks += 1
+            logger.info("Serving expired skill result: %s", e)
+            return entry[1]
+
+    async def _fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = await fetch()
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def _refresh(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]):
+        if key in self._flight:
+            return
+        task = asyncio.create_task(self._flight.do(key, lambda: self._fetch(key, fetch)))
+        self._refreshes.add(task)
+        task.add_done_callback(self._refresh_done)
+
+    def _refresh_done(self, task: asyncio.Task):
+        self._refreshes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.refresh_errors += 1
+            logger.warning("Background skill refresh failed: %s", task.exception())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "refresh_errors": self.refresh_errors,
+            "fallbacks": self.fallbacks,
+            "entries": len(self._entries),
+        }
@@ -1,10 +1,14 @@
 # services/stt.py
+import asyncio
 import logging
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, NamedTuple, Optional, Set, Tuple
+
 from assemblyai.streaming.v3 import (
     StreamingClient,
     StreamingClientOptions,
     StreamingParameters,
-    StreamingSessionParameters,
     StreamingEvents,
     BeginEvent,
     TurnEvent,
@@ -12,6 +16,9 @@ from assemblyai.streaming.v3 import (
     StreamingError,
 )
 
+import config
+from services import metrics, policy
+
 logger = logging.getLogger(__name__)
 
 def _on_begin(client, event: BeginEvent):
@@ -24,43 +31,344 @@ def _on_error(client, error: StreamingError):
     logger.error("AAI error: %s", error)
 
 class AssemblyAIStreamingTranscriber:
-    def __init__(self, sample_rate=16000, on_partial_callback=None, on_final_callback=None, api_key=None):
+    def __init__(self, sample_rate=16000, on_partial_callback=None, on_final_callback=None, api_key=None, on_error_callback=None):
+        # callbacks are read at event time, so they can be (re)attached after connecting
         self.on_partial_callback = on_partial_callback
         self.on_final_callback = on_final_callback
-        opts = StreamingClientOptions(api_key=api_key, api_host="streaming.assemblyai.com")
+        self.on_error_callback = on_error_callback
+        self.closed = False
+        self.error: Optional[StreamingError] = None
+        self._last_final: Optional[int] = None  # turn_order of the last final delivered
+        opts = StreamingClientOptions(api_key=api_key, api_host=config.ASSEMBLYAI_STREAMING_HOST)
         self.client = StreamingClient(opts)
 
         self.client.on(StreamingEvents.Begin, _on_begin)
-        self.client.on(StreamingEvents.Error, _on_error)
-        self.client.on(StreamingEvents.Termination, _on_termination)
+        self.client.on(StreamingEvents.Error, lambda client, error: self._on_error(client, error))
+        self.client.on(StreamingEvents.Termination, lambda client, event: self._on_termination(client, event))
         self.client.on(StreamingEvents.Turn, lambda client, event: self._on_turn(client, event))
 
-        self.client.connect(StreamingParameters(sample_rate=sample_rate, format_turns=False))
+        # formatted from the start: switching formatting on mid-session made AssemblyAI end
+        # every later turn twice (unformatted, then formatted), i.e. two finals per turn
+        self.client.connect(StreamingParameters(sample_rate=sample_rate, format_turns=True))
+
+    def _on_error(self, client, error: StreamingError):
+        _on_error(client, error)
+        self.error = error
+        self.closed = True
+        if self.on_error_callback:
+            self.on_error_callback(error)
+
+    def _on_termination(self, client, event: TerminationEvent):
+        _on_termination(client, event)
+        self.closed = True
 
     def _on_turn(self, client, event: TurnEvent):
         text = (event.transcript or "").strip()
         if not text:
             return
-        if event.end_of_turn:
+        # each turn ends twice: unformatted first, then formatted; only the latter is final
+        if event.end_of_turn and event.turn_is_formatted:
+            if event.turn_order == self._last_final:
+                return
+            self._last_final = event.turn_order
             if self.on_final_callback:
                 self.on_final_callback(text)
-            if not event.turn_is_formatted:
-                try:
-                    client.set_params(StreamingSessionParameters(format_turns=True))
-                except Exception as e:
-                    logger.exception("set_params error")
-        else:
-            if self.on_partial_callback:
-                self.on_partial_callback(text)
+        elif self.on_partial_callback:
+            self.on_partial_callback(text)
 
     def stream_audio(self, audio_chunk: bytes):
+        # the SDK only queues real `bytes` (other buffers are iterated), so memoryviews are copied once here
+        if not isinstance(audio_chunk, bytes):
+            audio_chunk = bytes(audio_chunk)
         try:
             self.client.stream(audio_chunk)
         except Exception:
             logger.exception("stream_audio failed")
+            self.closed = True
+            raise
+
+    def force_endpoint(self):
+        """Ask AssemblyAI to end the current turn now (used when local VAD sees end of speech)."""
+        force = getattr(self.client, "force_endpoint", None)
+        if force is None:
+            return
+        try:
+            force()
+        except Exception:
+            logger.exception("force_endpoint failed")
 
     def close(self):
+        self.closed = True
         try:
             self.client.disconnect(terminate=True)
         except Exception:
             pass
+
+
+
+# ---------------- asyncio session layer ---------------- #
+class STTError(Exception):
+    pass
+
+
+class TranscriptEvent(NamedTuple):
+    text: str
+    final: bool
+    # final events only: when end of speech was signalled (local VAD or finish()), as time.perf_counter()
+    endpoint_at: Optional[float] = None
+
+
+# queued after the last voiced chunk when local VAD detects end of speech
+_FORCE_ENDPOINT = object()
+
+
+class STTSession:
+    """One utterance on a connected transcriber, driven from the event loop.
+
+    Audio goes through a bounded queue: `feed` waits up to `max_wait` seconds
+    for room and then drops the frame (counted in `dropped_frames`). Transcripts
+    arrive on the SDK's thread and are hopped onto the loop; iterate the session
+    to get them as `TranscriptEvent`s until it finishes.
+
+    With a `vad` (see services/vad.py) only voiced audio is forwarded, and local
+    end of speech forces the upstream endpoint instead of waiting for it.
+    """
+
+    def __init__(self, transcriber: AssemblyAIStreamingTranscriber, max_queued_frames: int = 32, max_wait: float = 0.25, vad=None):
+        self.transcriber = transcriber
+        self.max_wait = max_wait
+        self.vad = vad
+        self._loop = asyncio.get_running_loop()
+        self._events: asyncio.Queue = asyncio.Queue()
+        self._audio: asyncio.Queue = asyncio.Queue(maxsize=max_queued_frames)
+        self._finished = False
+        self._endpoint_at: Optional[float] = None
+
+        self.frames_in = 0
+        self.bytes_in = 0
+        self.dropped_frames = 0
+        self.dropped_bytes = 0
+
+        transcriber.on_partial_callback = lambda text: self._post(TranscriptEvent(text, False))
+        transcriber.on_final_callback = lambda text: self._post(TranscriptEvent(text, True))
+        transcriber.on_error_callback = lambda error: self._post(STTError(str(error)))
+        self._pump = asyncio.create_task(self._pump_audio())
+
+    def _post(self, item):
+        # called on the SDK's thread
+        try:
+            self._loop.call_soon_threadsafe(self._events.put_nowait, item)
+        except RuntimeError:
+            pass  # loop already closed
+
+    @property
+    def queue_depth(self) -> int:
+        return self._audio.qsize()
+
+    async def feed(self, chunk) -> bool:
+        """Queue one audio chunk; returns False if it had to be dropped."""
+        if self._finished:
+            return False
+        if self.vad is None:
+            return await self._enqueue(chunk)
+        result = self.vad.process(chunk)
+        queued = await self._enqueue(result.audio) if result.audio else True
+        if result.speech_ended:
+            self._endpoint_at = time.perf_counter()
+            await self._audio.put(_FORCE_ENDPOINT)
+        return queued
+
+    async def _enqueue(self, chunk) -> bool:
+        try:
+            self._audio.put_nowait(chunk)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._audio.put(chunk), self.max_wait)
+            except asyncio.TimeoutError:
+                self.dropped_frames += 1
+                self.dropped_bytes += len(chunk)
+                return False
+        self.frames_in += 1
+        self.bytes_in += len(chunk)
+        return True
+
+    async def _pump_audio(self):
+        while True:
+            chunk = await self._audio.get()
+            if chunk is None:
+                return
+            if chunk is _FORCE_ENDPOINT:
+                self.transcriber.force_endpoint()
+                continue
+            try:
+                # StreamingClient.stream only enqueues for the SDK's writer thread, so this doesn't block
+                self.transcriber.stream_audio(chunk)
+            except Exception as e:
+                self._post(STTError(f"stream_audio failed: {e}"))
+                return
+
+    async def finish(self):
+        """Flush queued audio, terminate the upstream session and end the event stream."""
+        if self._finished:
+            return
+        if self._endpoint_at is None:
+            self._endpoint_at = time.perf_counter()
+        if self.vad is not None:
+            tail = self.vad.flush()
+            if tail:
+                await self._enqueue(tail)
+        self._finished = True
+        await self._audio.put(None)
+        await self._pump
+        # terminating delivers the last turn through the callbacks before returning
+        await asyncio.to_thread(self.transcriber.close)
+        self._events.put_nowait(None)
+
+    async def abort(self):
+        self._finished = True
+        self._pump.cancel()
+        await asyncio.to_thread(self.transcriber.close)
+        self._events.put_nowait(None)
+
+    def __aiter__(self) -> AsyncIterator[TranscriptEvent]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[TranscriptEvent]:
+        while True:
+            item = await self._events.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            if item.final:
+                item, self._endpoint_at = item._replace(endpoint_at=self._endpoint_at), None
+            yield item
+
+
+def _connect_failed(transcriber: AssemblyAIStreamingTranscriber) -> Optional[Tuple[str, Optional[float]]]:
+    """Policy check: a handshake AssemblyAI rejected with a 4xx (bad key, quota) is the caller's
+    problem and doesn't count against the provider's breaker; other failures do."""
+    if not transcriber.closed:
+        return None
+    code = getattr(transcriber.error, "code", None)
+    if isinstance(code, int) and 400 <= code < 500:
+        return None
+    return "connect_failed", None
+
+
+class STTSessionManager:
+    """Hands out `STTSession`s, keeping up to `pool_size` pre-connected transcribers per API key.
+
+    Warm transcribers skip the connect/handshake on the next utterance. AssemblyAI
+    bills connected time, so idle ones are closed after `max_idle` seconds.
+    """
+
+    def __init__(self, pool_size: int = 1, max_idle: float = 60, max_queued_frames: int = 32, max_wait: float = 0.25, vad_factory=None):
+        self.vad_factory = vad_factory
+        self.pool_size = pool_size
+        self.max_idle = max_idle
+        self.max_queued_frames = max_queued_frames
+        self.max_wait = max_wait
+        self._idle: Dict[Tuple[str, int], Deque[Tuple[float, AssemblyAIStreamingTranscriber]]] = {}
+        self._connecting: Dict[Tuple[str, int], int] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.sessions_opened = 0
+        self.pool_hits = 0
+        self.pool_misses = 0
+        self.connect_errors = 0
+
+    @staticmethod
+    def _connect(api_key: str, sample_rate: int) -> AssemblyAIStreamingTranscriber:
+        return AssemblyAIStreamingTranscriber(sample_rate=sample_rate, api_key=api_key)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _take_warm(self, key: Tuple[str, int]) -> Optional[AssemblyAIStreamingTranscriber]:
+        idle = self._idle.get(key)
+        now = time.monotonic()
+        while idle:
+            since, transcriber = idle.popleft()
+            if not transcriber.closed and now - since < self.max_idle:
+                return transcriber
+            self._spawn(asyncio.to_thread(transcriber.close))
+        return None
+
+    def prewarm(self, api_key: str, sample_rate: int = 16000):
+        """Top up the warm pool for `api_key` in the background."""
+        if not api_key or self.pool_size <= 0:
+            return
+        key = (api_key, sample_rate)
+        missing = self.pool_size - len(self._idle.get(key, ())) - self._connecting.get(key, 0)
+        for _ in range(missing):
+            self._connecting[key] = self._connecting.get(key, 0) + 1
+            self._spawn(self._warm_one(key))
+
+    async def _dial(self, api_key: str, sample_rate: int) -> AssemblyAIStreamingTranscriber:
+        """Connect under the "assemblyai" upstream policy (admission + circuit breaker)."""
+        transcriber = await policy.get("assemblyai").run(
+            lambda: asyncio.to_thread(self._connect, api_key, sample_rate), check=_connect_failed)
+        if transcriber.closed:
+            # the SDK reports a failed handshake through the Error event rather than raising
+            self._spawn(asyncio.to_thread(transcriber.close))
+            raise STTError(f"connect failed: {transcriber.error or 'session closed'}")
+        return transcriber
+
+    async def _warm_one(self, key: Tuple[str, int]):
+        try:
+            transcriber = await self._dial(*key)
+        except policy.ProviderUnavailable as e:
+            logger.info("STT prewarm skipped: %s", e)
+            return
+        except Exception:
+            self.connect_errors += 1
+            logger.exception("STT prewarm failed")
+            return
+        finally:
+            self._connecting[key] -= 1
+        entry = (time.monotonic(), transcriber)
+        self._idle.setdefault(key, deque()).append(entry)
+        asyncio.get_running_loop().call_later(self.max_idle, self._expire, key, entry)
+
+    def _expire(self, key, entry):
+        idle = self._idle.get(key)
+        if idle and entry in idle:
+            idle.remove(entry)
+            self._spawn(asyncio.to_thread(entry[1].close))
+
+    async def open_session(self, api_key: str, sample_rate: int = 16000) -> STTSession:
+        key = (api_key, sample_rate)
+        transcriber = self._take_warm(key)
+        if transcriber is not None:
+            self.pool_hits += 1
+        else:
+            self.pool_misses += 1
+            try:
+                with metrics.span("stt_connect"):
+                    transcriber = await self._dial(api_key, sample_rate)
+            except Exception:
+                self.connect_errors += 1
+                raise
+        self.sessions_opened += 1
+        self.prewarm(api_key, sample_rate)
+        vad = self.vad_factory() if self.vad_factory else None
+        return STTSession(transcriber, self.max_queued_frames, self.max_wait, vad=vad)
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        idle = [t for pool in self._idle.values() for _, t in pool]
+        self._idle.clear()
+        await asyncio.gather(*(asyncio.to_thread(t.close) for t in idle), return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions_opened": self.sessions_opened,
+            "pool_hits": self.pool_hits,
+            "pool_misses": self.pool_misses,
+            "connect_errors": self.connect_errors,
+            "idle": sum(len(pool) for pool in self._idle.values()),
+        }
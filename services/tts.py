@@ -1,49 +1,52 @@
 # services/tts.py
-import requests
 from pathlib import Path
 import logging
-import time
+
+import config
+from services import metrics, upstream
+from services.tts_cache import TTSCache, normalize_text
 
 logger = logging.getLogger(__name__)
 
 UPLOADS_DIR = Path(__file__).resolve().parent.parent / "uploads"
 UPLOADS_DIR.mkdir(exist_ok=True)
 
-MURF_GENERATE_URL = "https://api.murf.ai/v1/speech/generate"
+MURF_GENERATE_URL = f"{config.MURF_BASE_URL}/speech/generate"
+DEFAULT_VOICE = "en-US-michelle"
 
-def speak(text: str, api_key: str, output_name: str = "stream_output.mp3") -> bytes:
-    """
-    Request Murf to synthesize `text` and return bytes of audio (mp3).
-    This uses the Murf /generate endpoint and then downloads the audio file.
-    """
-    if not api_key:
-        raise Exception("No Murf API key provided for TTS.")
+cache = TTSCache(
+    Path(config.TTS_CACHE_DIR) if config.TTS_CACHE_DIR else UPLOADS_DIR / "tts_cache",
+    max_memory_bytes=int(config.TTS_CACHE_MEMORY_MB * 1024 * 1024),
+    max_disk_bytes=int(config.TTS_CACHE_DISK_MB * 1024 * 1024),
+)
+metrics.StatsCollector("byte_tts_cache", "TTS audio cache", cache.stats)
 
+async def generate(text: str, api_key: str, voice_id: str = DEFAULT_VOICE, fmt: str = "MP3") -> str:
+    """Ask Murf to synthesize `text` and return the hosted audio URL."""
     headers = {"Content-Type": "application/json", "api-key": api_key}
-    payload = {
-        "voiceId": "en-US-1",
-        "text": text,
-        "format": "mp3"
-    }
-    try:
-        resp = requests.post(MURF_GENERATE_URL, json=payload, headers=headers, timeout=30)
-        resp.raise_for_status()
-        j = resp.json()
-        # Murf responds with 'audioFile' or similar. check keys:
-        audio_url = j.get("audioUrl") or j.get("audioFile") or j.get("audio_url")
-        if not audio_url:
-            # some Murf plans return a task id; handle that flow if needed
-            raise Exception("Murf did not return audio URL: " + str(j))
-
-        # download audio
-        r2 = requests.get(audio_url, timeout=30)
-        r2.raise_for_status()
-        audio_bytes = r2.content
-        # save for debugging
-        out_path = UPLOADS_DIR / output_name
-        with open(out_path, "wb") as f:
-            f.write(audio_bytes)
-        return audio_bytes
-    except Exception as e:
-        logger.exception("Murf TTS failed")
-        raise
+    payload = {"voiceId": voice_id, "text": text, "format": fmt}
+    r = await upstream.post(MURF_GENERATE_URL, provider="murf", idempotent=True, json=payload, headers=headers, timeout=30)
+    upstream.raise_for_status(r, "murf")
+    j = r.json()
+    # Murf responds with 'audioFile' or similar. check keys:
+    audio_url = j.get("audioUrl") or j.get("audioFile") or j.get("audio_url")
+    if not audio_url:
+        # some Murf plans return a task id; handle that flow if needed
+        raise Exception("Murf did not return audio URL: " + str(j)[:200])
+    return audio_url
+
+async def _fetch_audio(text: str, api_key: str, voice_id: str, fmt: str) -> bytes:
+    with metrics.span("tts_fetch"):
+        audio_url = await generate(text, api_key, voice_id=voice_id, fmt=fmt)
+        r = await upstream.get(audio_url, provider="murf_audio", timeout=30)
+        upstream.raise_for_status(r, "murf_audio")
+        return r.content
+
+async def synthesize(text: str, api_key: str, voice_id: str = DEFAULT_VOICE, fmt: str = "MP3") -> bytes:
+    """
+    Return audio bytes for `text` from the TTS cache, calling Murf only on a miss.
+    """
+    text = normalize_text(text)
+    key = cache.make_key(text, voice_id, fmt)
+    with metrics.span("tts"):
+        return await cache.get_or_create(key, lambda: _fetch_audio(text, api_key, voice_id, fmt))
@@ -0,0 +1,160 @@
+# services/tts_cache.py
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+from services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# cache entries are named "<sha256>.<ext>"; other files in the directory are never indexed or deleted
+KEY_RE = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]{2,5}$")
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class TTSCache:
+    """Content-addressed audio cache: bounded in-memory LRU in front of a size-capped directory.
+
+    Concurrent `get_or_create` calls for the same key share one upstream request.
+    """
+
+    def __init__(self, directory: Path, max_memory_bytes: int, max_disk_bytes: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self._mem: "OrderedDict[str, bytes]" = OrderedDict()
+        self._mem_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()  # key -> size, oldest first
+        self._disk_bytes = 0
+        self._flight = SingleFlight()
+
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+        self._load_index()
+
+    @staticmethod
+    def make_key(text: str, voice_id: str, fmt: str) -> str:
+        raw = f"{voice_id}\x00{fmt.upper()}\x00{normalize_text(text)}"
+        return f"{hashlib.sha256(raw.encode('utf-8')).hexdigest()}.{fmt.lower()}"
+
+    def _load_index(self):
+        entries = []
+        for p in self.directory.iterdir():
+            if p.is_file() and KEY_RE.match(p.name):
+                st = p.stat()
+                entries.append((st.st_mtime, p.name, st.st_size))
+            elif p.name.startswith(".tmp-"):
+                p.unlink(missing_ok=True)  # leftover from an interrupted write
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    # ---------------- memory tier ---------------- #
+    def _remember(self, key: str, data: bytes):
+        if len(data) > self.max_memory_bytes:
+            return
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._mem_bytes -= len(old)
+        self._mem[key] = data
+        self._mem_bytes += len(data)
+        while self._mem_bytes > self.max_memory_bytes:
+            _, evicted = self._mem.popitem(last=False)
+            self._mem_bytes -= len(evicted)
+
+    # ---------------- disk tier ---------------- #
+    def _write_atomic(self, key: str, data: bytes):
+        fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self.directory / key)
+        except Exception:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self.evictions += 1
+            (self.directory / key).unlink(missing_ok=True)
+
+    # ---------------- public API ---------------- #
+    async def get(self, key: str) -> Optional[bytes]:
+        data = self._mem.get(key)
+        if data is not None:
+            self._mem.move_to_end(key)
+            self.hits_memory += 1
+            return data
+        if key in self._disk:
+            try:
+                data = await asyncio.to_thread((self.directory / key).read_bytes)
+            except FileNotFoundError:
+                data = None
+            if data is not None:
+                if key in self._disk:
+                    self._disk.move_to_end(key)
+                self._remember(key, data)
+                self.hits_disk += 1
+                return data
+        return None
+
+    async def put(self, key: str, data: bytes):
+        self._remember(key, data)
+        if key in self._disk or len(data) > self.max_disk_bytes:
+            return
+        try:
+            await asyncio.to_thread(self._write_atomic, key, data)
+        except Exception:
+            logger.exception("TTS cache write failed for %s", key)
+            return
+        self._disk[key] = len(data)
+        self._disk_bytes += len(data)
+        self._evict_disk()
+
+    async def get_or_create(self, key: str, factory: Callable[[], Awaitable[bytes]]) -> bytes:
+        data = await self.get(key)
+        if data is not None:
+            return data
+
+        if key in self._flight:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        return await self._flight.do(key, lambda: self._create(key, factory))
+
+    async def _create(self, key: str, factory: Callable[[], Awaitable[bytes]]) -> bytes:
+        data = await factory()
+        await self.put(key, data)
+        return data
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "memory_entries": len(self._mem),
+            "memory_bytes": self._mem_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+        }
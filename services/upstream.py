@@ -0,0 +1,201 @@
+# services/upstream.py
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+import config
+from services import metrics, policy
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 needs the optional `h2` package (pip install "httpx[http2]")
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except Exception:
+    HTTP2_AVAILABLE = False
+
+# one pooled client per upstream origin, e.g. "https://api.murf.ai"
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _make_client(origin: str) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=config.UPSTREAM_POOL_SIZE,
+        max_keepalive_connections=config.UPSTREAM_POOL_SIZE,
+        keepalive_expiry=config.UPSTREAM_KEEPALIVE_EXPIRY,
+    )
+    # HTTP/2 is only negotiated over TLS; plain-http hosts stay on HTTP/1.1 keep-alive
+    http2 = config.UPSTREAM_HTTP2 and HTTP2_AVAILABLE and origin.startswith("https://")
+    logger.info("Opening upstream pool for %s (size=%s, http2=%s)", origin, config.UPSTREAM_POOL_SIZE, http2)
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=limits,
+        timeout=httpx.Timeout(30, connect=config.UPSTREAM_CONNECT_TIMEOUT),
+    )
+
+
+class UpstreamError(Exception):
+    """An upstream answered with an error status.
+
+    Unlike httpx.HTTPStatusError, the message never includes the request URL,
+    which can carry API keys in its query string.
+    """
+
+    def __init__(self, provider: str, status_code: int, detail: str = ""):
+        super().__init__(f"{provider} returned HTTP {status_code}" + (f": {detail}" if detail else ""))
+        self.provider = provider
+        self.status_code = status_code
+        self.detail = detail
+
+
+class UpstreamServerError(UpstreamError):
+    """A 5xx: the provider failed, not the request, so retrying or falling back can help."""
+
+
+def error_detail(r: httpx.Response) -> str:
+    """The provider's own error message from a JSON error body, if it has one."""
+    try:
+        body = r.json()
+    except ValueError:
+        return r.reason_phrase
+    if isinstance(body, list) and body:  # Gemini's SSE endpoint wraps errors in a list
+        body = body[0]
+    if not isinstance(body, dict):
+        return r.reason_phrase
+    err = body.get("error")
+    if isinstance(err, dict):
+        err = err.get("message")
+    return str(err or body.get("message") or body.get("errorMessage") or r.reason_phrase)[:200]
+
+
+def raise_for_status(r: httpx.Response, provider: str):
+    """Use instead of `r.raise_for_status()` so error text and logs stay free of keys."""
+    if r.status_code >= 500:
+        raise UpstreamServerError(provider, r.status_code, error_detail(r))
+    if r.status_code >= 400:
+        raise UpstreamError(provider, r.status_code, error_detail(r))
+
+
+def client_for(url: str) -> httpx.AsyncClient:
+    """Return the shared client for the host of `url`, creating its pool on first use."""
+    origin = _origin(url)
+    client = _clients.get(origin)
+    if client is None or client.is_closed:
+        client = _clients[origin] = _make_client(origin)
+    return client
+
+
+def _observe(provider: str, start: float, r: Optional[httpx.Response]):
+    metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - start, provider)
+    metrics.UPSTREAM_REQUESTS.inc(provider, r.status_code if r is not None else "error")
+    if r is not None:
+        metrics.UPSTREAM_BYTES.inc(provider, "out", amount=int(r.request.headers.get("content-length", 0)))
+
+
+def _retry_after(r: httpx.Response) -> Optional[float]:
+    try:
+        return float(r.headers["retry-after"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _check(r: httpx.Response) -> Optional[Tuple[str, Optional[float]]]:
+    """Policy check: 429 backs off, 5xx counts against the provider; anything else is the caller's business."""
+    if r.status_code == 429:
+        return "throttled", _retry_after(r)
+    if r.status_code >= 500:
+        return f"http_{r.status_code}", _retry_after(r)
+    return None
+
+
+async def _send(method: str, url: str, provider: str, **kwargs) -> httpx.Response:
+    start = time.perf_counter()
+    r = None
+    try:
+        r = await client_for(url).request(method, url, **kwargs)
+        metrics.UPSTREAM_BYTES.inc(provider, "in", amount=r.num_bytes_downloaded)
+        return r
+    finally:
+        _observe(provider, start, r)
+
+
+async def request(method: str, url: str, provider: Optional[str] = None, idempotent: Optional[bool] = None, **kwargs) -> httpx.Response:
+    """
+    `provider` picks the admission/retry/breaker policy (services/policy.py) and labels
+    /metrics; it defaults to the host name. GETs are retried on transient failures;
+    pass `idempotent=True` for POSTs that are safe to repeat. Raises
+    policy.ProviderUnavailable without calling out while the provider's breaker is open.
+    """
+    provider = provider or urlsplit(url).hostname
+    retry = method in ("GET", "HEAD") if idempotent is None else idempotent
+    return await policy.get(provider).run(lambda: _send(method, url, provider, **kwargs),
+                                          retry=retry, check=_check, transient=(httpx.TransportError,))
+
+
+async def get(url: str, **kwargs) -> httpx.Response:
+    return await request("GET", url, **kwargs)
+
+
+async def post(url: str, **kwargs) -> httpx.Response:
+    return await request("POST", url, **kwargs)
+
+
+async def startup():
+    if config.UPSTREAM_HTTP2 and not HTTP2_AVAILABLE:
+        logger.warning("UPSTREAM_HTTP2 is on but `h2` is not installed; using HTTP/1.1 keep-alive")
+
+
+async def shutdown():
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception:
+            logger.exception("Closing upstream client failed")
+
+
+async def _open_stream(method: str, url: str, provider: str, **kwargs) -> httpx.Response:
+    client = client_for(url)
+    timeout = kwargs.pop("timeout", httpx.USE_CLIENT_DEFAULT)
+    start = time.perf_counter()
+    r = None
+    try:
+        r = await client.send(client.build_request(method, url, timeout=timeout, **kwargs), stream=True)
+        if r.status_code >= 400:
+            await r.aread()  # error bodies are small; reading them also releases the connection
+        return r
+    finally:
+        _observe(provider, start, r)
+
+
+@asynccontextmanager
+async def stream(method: str, url: str, provider: Optional[str] = None, idempotent: bool = False, **kwargs):
+    """
+    Streaming request on the shared pool; use as `async with upstream.stream(...) as r:`.
+    The provider's concurrency slot is held until the stream is closed; with
+    `idempotent=True`, failures before the first byte are retried.
+    """
+    provider = provider or urlsplit(url).hostname
+    pol = policy.get(provider)
+    async with pol.admit():
+        r = await pol.run(lambda: _open_stream(method, url, provider, **kwargs), retry=idempotent,
+                          check=_check, transient=(httpx.TransportError,), admitted=True)
+        try:
+            yield r
+        except httpx.TransportError:
+            pol.breaker.failure()  # broke off mid-stream
+            raise
+        finally:
+            metrics.UPSTREAM_BYTES.inc(provider, "in", amount=r.num_bytes_downloaded)
+            await r.aclose()
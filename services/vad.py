@@ -0,0 +1,203 @@
+# services/vad.py
+import logging
+from collections import deque
+from typing import Callable, NamedTuple, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# optional webrtcvad - wrap to allow running if not installed
+try:
+    import webrtcvad
+    WEBRTCVAD_AVAILABLE = True
+except Exception:
+    WEBRTCVAD_AVAILABLE = False
+
+# model(frames, sample_rate) -> bool array, one entry per frame; frames is int16 of shape (n, frame_len)
+SpeechModel = Callable[[np.ndarray, int], np.ndarray]
+
+
+class VADResult(NamedTuple):
+    audio: bytes          # voiced audio to forward upstream (may be empty)
+    speech_started: bool
+    speech_ended: bool    # enough trailing silence to close the turn locally
+
+
+def webrtcvad_model(aggressiveness: int = 2) -> Optional[SpeechModel]:
+    """Adapter for the `webrtcvad` package (frames must be 10/20/30 ms)."""
+    if not WEBRTCVAD_AVAILABLE:
+        return None
+    vad = webrtcvad.Vad(aggressiveness)
+
+    def model(frames: np.ndarray, sample_rate: int) -> np.ndarray:
+        return np.fromiter((vad.is_speech(f.tobytes(), sample_rate) for f in frames), dtype=bool, count=len(frames))
+
+    return model
+
+
+class VoiceActivityDetector:
+    """Energy/zero-crossing VAD over 16-bit mono PCM, run in front of streaming STT.
+
+    Silent frames are dropped, except `preroll_ms` before speech onset and
+    `hangover_ms` after it (so word edges aren't clipped). After `end_of_speech_ms`
+    of silence the result reports `speech_ended`, letting the caller close the
+    turn without waiting for the remote endpointer. Output is batched into chunks
+    of at least `min_chunk_ms`, as streaming STT rejects very short chunks.
+
+    The per-frame energy/ZCR analysis is vectorized across each incoming chunk;
+    `model` can refine the decision for frames that pass the energy gate.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 20,
+        threshold_db: float = -50.0,
+        margin_db: float = 10.0,
+        zcr_max: float = 0.35,
+        preroll_ms: int = 200,
+        hangover_ms: int = 300,
+        end_of_speech_ms: int = 700,
+        min_chunk_ms: int = 60,
+        model: Optional[SpeechModel] = None,
+    ):
+        self.sample_rate = sample_rate
+        self.frame_len = sample_rate * frame_ms // 1000
+        self.frame_bytes = self.frame_len * 2
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.zcr_max = zcr_max
+        self.preroll_frames = preroll_ms // frame_ms
+        self.hangover_frames = hangover_ms // frame_ms
+        self.end_frames = end_of_speech_ms // frame_ms
+        self.min_chunk_bytes = self.frame_bytes * max(1, min_chunk_ms // frame_ms)
+        self.model = model
+
+        self.noise_floor_db = -60.0
+        self.in_speech = False
+        self.silence_run = 0
+        self._remainder = b""
+        self._preroll: deque = deque(maxlen=self.preroll_frames)
+        self._out = bytearray()
+
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.utterances = 0
+
+    @property
+    def trimmed_ratio(self) -> float:
+        """Fraction of input bytes that were not forwarded."""
+        return 1 - self.bytes_out / self.bytes_in if self.bytes_in else 0.0
+
+    def classify(self, frames: np.ndarray) -> np.ndarray:
+        """Per-frame speech decision for int16 frames of shape (n, frame_len)."""
+        x = frames.astype(np.float32) / 32768.0
+        rms = np.sqrt(np.mean(x * x, axis=1))
+        db = 20 * np.log10(rms + 1e-9)
+        signs = np.signbit(x)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (x.shape[1] - 1)
+
+        threshold = max(self.threshold_db, self.noise_floor_db + self.margin_db)
+        # loud frames always count; quieter ones only if they aren't noise-like (high ZCR)
+        voiced = (db > threshold) & ((zcr < self.zcr_max) | (db > threshold + self.margin_db))
+        if self.model is not None and voiced.any():
+            voiced &= np.asarray(self.model(frames, self.sample_rate), dtype=bool)
+
+        quiet = db[~voiced]
+        if quiet.size:
+            self.noise_floor_db = 0.9 * self.noise_floor_db + 0.1 * float(np.mean(quiet))
+        return voiced
+
+    def process(self, chunk) -> VADResult:
+        """Feed a chunk of PCM16 bytes; returns audio to forward and turn boundaries."""
+        self.bytes_in += len(chunk)
+        data = self._remainder + bytes(chunk) if self._remainder else chunk
+        n = len(data) // self.frame_bytes
+        usable = n * self.frame_bytes
+        self._remainder = bytes(data[usable:])
+        if not n:
+            return VADResult(b"", False, False)
+
+        view = memoryview(data)[:usable]
+        frames = np.frombuffer(view, dtype="<i2").reshape(n, self.frame_len)
+        voiced = self.classify(frames)
+
+        started = ended = False
+        fb = self.frame_bytes
+        for i, is_voiced in enumerate(voiced.tolist()):
+            frame = view[i * fb:(i + 1) * fb]
+            if is_voiced:
+                if not self.in_speech:
+                    self.in_speech = True
+                    started = True
+                    self.utterances += 1
+                    for pre in self._preroll:
+                        self._out += pre
+                    self._preroll.clear()
+                self.silence_run = 0
+                self._out += frame
+            elif self.in_speech:
+                self.silence_run += 1
+                if self.silence_run <= self.hangover_frames:
+                    self._out += frame
+                if self.silence_run >= self.end_frames:
+                    self.in_speech = False
+                    ended = True
+            else:
+                self._preroll.append(bytes(frame))
+
+        if len(self._out) >= self.min_chunk_bytes or (ended and self._out):
+            out = bytes(self._out)
+            self._out.clear()
+            self.bytes_out += len(out)
+            return VADResult(out, started, ended)
+        return VADResult(b"", started, ended)
+
+    def flush(self) -> bytes:
+        """Return any voiced audio still buffered (call when the stream ends)."""
+        out = bytes(self._out)
+        self._out.clear()
+        self.bytes_out += len(out)
+        return out
+
+
+def read_wav_pcm16(path: str, sample_rate: int = 16000) -> bytes:
+    """Load a 16-bit WAV as mono PCM16 at `sample_rate` (for fixtures and benchmarks)."""
+    import wave
+
+    with wave.open(path, "rb") as w:
+        rate, width, channels = w.getframerate(), w.getsampwidth(), w.getnchannels()
+        raw = w.readframes(w.getnframes())
+    # streamed WAVs may carry a bogus frame count, so trim to whole frames
+    samples = np.frombuffer(raw[: len(raw) // (width * channels) * width * channels], dtype="<i2")
+    samples = samples.reshape(-1, channels).mean(axis=1)
+    if rate != sample_rate:
+        t = np.arange(0, len(samples) / rate, 1 / sample_rate)
+        samples = np.interp(t, np.arange(len(samples)) / rate, samples)
+    return samples.astype("<i2").tobytes()
+
+
+def _bench(path: str):
+    """Run the VAD over a WAV file and report trimming and throughput."""
+    import time
+
+    pcm = read_wav_pcm16(path)
+    vad = VoiceActivityDetector()
+    chunk = 16000 * 2 * 128 // 1000  # 128 ms, same as the browser mic frames
+    endings = 0
+    start = time.perf_counter()
+    for off in range(0, len(pcm), chunk):
+        endings += vad.process(pcm[off:off + chunk]).speech_ended
+    vad.flush()
+    elapsed = time.perf_counter() - start
+
+    audio_s = len(pcm) / 32000
+    print(f"audio: {audio_s:.2f} s, processed in {elapsed * 1000:.1f} ms ({audio_s / elapsed:.0f}x real time)")
+    print(f"utterances: {vad.utterances}, local end-of-speech events: {endings}")
+    print(f"forwarded {vad.bytes_out}/{vad.bytes_in} bytes, trimmed {vad.trimmed_ratio:.1%}")
+
+
+if __name__ == "__main__":
+    import sys
+    _bench(sys.argv[1] if len(sys.argv) > 1 else "uploads/stream_output.wav")
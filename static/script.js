@@ -1,29 +1,139 @@
-let mediaRecorder;
-let chunks = [];
-
-document.getElementById("micBtn").onclick = async () => {
-  if (!mediaRecorder || mediaRecorder.state === "inactive") {
-    let stream = await navigator.mediaDevices.getUserMedia({ audio: true });
-    mediaRecorder = new MediaRecorder(stream);
-
-    mediaRecorder.ondataavailable = (e) => chunks.push(e.data);
-    mediaRecorder.onstop = () => {
-      let blob = new Blob(chunks, { type: "audio/webm" });
-      let reader = new FileReader();
-      reader.onloadend = () => {
-        let b64 = reader.result.split(",")[1];
-        ws.send(JSON.stringify({ type: "audio_input", b64: b64 }));
-      };
-      reader.readAsDataURL(blob);
-      chunks = [];
-    };
-
-    mediaRecorder.start();
-    console.log("🎙️ Recording started");
-    document.getElementById("micBtn").innerText = "Stop Recording";
-  } else {
-    mediaRecorder.stop();
-    console.log("🛑 Recording stopped");
-    document.getElementById("micBtn").innerText = "Start Recording";
+// Binary audio transport for /ws (frame layout: services/audio_frames.py)
+const FRAME_VERSION = 1;
+const HEADER_SIZE = 12;
+const CODEC_PCM16 = 0;
+const FLAG_END_SEGMENT = 0x1;
+const FLAG_END_STREAM = 0x2;
+const MIC_SAMPLE_RATE = 16000;
+
+function encodeFrame(codec, streamId, seq, flags, payload) {
+  let frame = new Uint8Array(HEADER_SIZE + payload.byteLength);
+  let view = new DataView(frame.buffer);
+  view.setUint8(0, FRAME_VERSION);
+  view.setUint8(1, codec);
+  view.setUint16(2, flags);
+  view.setUint32(4, streamId);
+  view.setUint32(8, seq);
+  frame.set(new Uint8Array(payload.buffer, payload.byteOffset, payload.byteLength), HEADER_SIZE);
+  return frame.buffer;
+}
+
+function parseFrame(buffer) {
+  let view = new DataView(buffer);
+  return {
+    codec: view.getUint8(1),
+    flags: view.getUint16(2),
+    streamId: view.getUint32(4),
+    seq: view.getUint32(8),
+    payload: new Uint8Array(buffer, HEADER_SIZE),
+  };
+}
+
+// ---------------- mic -> server ---------------- //
+let mic = null;
+
+async function startRecording() {
+  if (mic) return stopRecording();
+  stopSpeaking();  // barge-in: the server cancels the reply as soon as audio arrives
+
+  let stream = await navigator.mediaDevices.getUserMedia({ audio: { channelCount: 1, echoCancellation: true } });
+  let ctx = new AudioContext({ sampleRate: MIC_SAMPLE_RATE });
+  let source = ctx.createMediaStreamSource(stream);
+  let node = ctx.createScriptProcessor(2048, 1, 1);  // 128 ms per frame at 16 kHz
+  mic = { ctx, source, node, stream, streamId: (Math.random() * 0xffffffff) >>> 0, seq: 0 };
+
+  node.onaudioprocess = (e) => {
+    if (!mic) return;
+    let input = e.inputBuffer.getChannelData(0);
+    let pcm = new Int16Array(input.length);  // little-endian on every browser platform
+    for (let i = 0; i < input.length; i++) {
+      let s = Math.max(-1, Math.min(1, input[i]));
+      pcm[i] = s < 0 ? s * 0x8000 : s * 0x7fff;
+    }
+    ws.send(encodeFrame(CODEC_PCM16, mic.streamId, mic.seq++, 0, pcm));
+  };
+  source.connect(node);
+  node.connect(ctx.destination);
+  document.getElementById("micBtn").innerText = "⏹";
+}
+
+function stopRecording() {
+  if (!mic) return;
+  let m = mic;
+  mic = null;
+  m.node.disconnect();
+  m.source.disconnect();
+  m.stream.getTracks().forEach((t) => t.stop());
+  m.ctx.close();
+  ws.send(encodeFrame(CODEC_PCM16, m.streamId, m.seq, FLAG_END_STREAM, new Uint8Array(0)));
+  document.getElementById("micBtn").innerText = "🎙";
+}
+
+// ---------------- server -> speaker ---------------- //
+// One stream per assistant turn. With MediaSource the turn starts playing from its
+// first chunk; otherwise each sentence clip plays once its last chunk arrives.
+let speakerStreams = {};
+let cancelledStreams = new Set();  // interrupted turns; late frames for them are ignored
+const USE_MSE = !!(window.MediaSource && MediaSource.isTypeSupported("audio/mpeg"));
+
+function handleAudioFrame(buffer) {
+  let f = parseFrame(buffer);
+  if (cancelledStreams.has(f.streamId)) return;
+  let s = speakerStreams[f.streamId] || openSpeakerStream(f.streamId);
+  if (f.payload.byteLength) s.pending.push(f.payload);
+  if (f.flags & FLAG_END_SEGMENT) s.segmentDone = true;
+  if (f.flags & FLAG_END_STREAM) s.ended = true;
+  pumpSpeakerStream(s);
+}
+
+function openSpeakerStream(id) {
+  let s = { id, pending: [], segmentDone: false, ended: false, mediaSource: null, sourceBuffer: null };
+  speakerStreams[id] = s;
+  if (USE_MSE) {
+    s.mediaSource = new MediaSource();
+    s.mediaSource.addEventListener("sourceopen", () => {
+      s.sourceBuffer = s.mediaSource.addSourceBuffer("audio/mpeg");
+      s.sourceBuffer.mode = "sequence";
+      s.sourceBuffer.addEventListener("updateend", () => pumpSpeakerStream(s));
+      pumpSpeakerStream(s);
+    });
+    enqueueAudio(URL.createObjectURL(s.mediaSource));
+  }
+  return s;
+}
+
+function pumpSpeakerStream(s) {
+  if (s.mediaSource) {
+    if (!s.sourceBuffer || s.sourceBuffer.updating) return;
+    if (s.pending.length) {
+      s.sourceBuffer.appendBuffer(s.pending.shift());
+    } else if (s.ended && s.mediaSource.readyState === "open") {
+      s.mediaSource.endOfStream();
+      delete speakerStreams[s.id];
+    }
+    return;
   }
-};
+  if (s.segmentDone && s.pending.length) {
+    enqueueAudio(URL.createObjectURL(new Blob(s.pending, { type: "audio/mpeg" })));
+    s.pending = [];
+  }
+  s.segmentDone = false;
+  if (s.ended) delete speakerStreams[s.id];
+}
+
+// Stop the reply being played (the server sends {"type": "cancelled"} for interrupted turns).
+function cancelSpeakerStream(turnId) {
+  let id = parseInt(turnId, 16);
+  cancelledStreams.add(id);
+  delete speakerStreams[id];
+  stopSpeaking();
+}
+
+function stopSpeaking() {
+  speakerStreams = {};
+  audioQueue.forEach((url) => URL.revokeObjectURL(url));
+  audioQueue.length = 0;
+  audioPlayer.pause();
+  audioPlayer.removeAttribute("src");
+  releaseCurrentAudio();
+}
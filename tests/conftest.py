@@ -0,0 +1,12 @@
+# tests/conftest.py
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def run():
+    def run(coro, timeout: float = 5):
+        """Run a test coroutine; a regression that deadlocks fails instead of hanging the suite."""
+        return asyncio.run(asyncio.wait_for(coro, timeout))
+    return run
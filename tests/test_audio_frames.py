@@ -0,0 +1,35 @@
+# tests/test_audio_frames.py
+import pytest
+
+from services import audio_frames
+from services.audio_frames import CODEC_MP3, CODEC_PCM16, FLAG_END_SEGMENT, FLAG_END_STREAM, FrameError
+
+
+def test_encode_parse_round_trip():
+    frame = audio_frames.encode_frame(CODEC_PCM16, 0xDEADBEEF, 7, b"\x01\x02\x03", FLAG_END_STREAM)
+    header, payload = audio_frames.parse_frame(frame)
+    assert header == (audio_frames.VERSION, CODEC_PCM16, FLAG_END_STREAM, 0xDEADBEEF, 7)
+    assert bytes(payload) == b"\x01\x02\x03"
+
+
+def test_parse_rejects_short_and_unknown_version_frames():
+    with pytest.raises(FrameError):
+        audio_frames.parse_frame(b"\x01\x00\x00")
+    with pytest.raises(FrameError):
+        audio_frames.parse_frame(b"\x09" + bytes(audio_frames.HEADER_SIZE - 1))
+
+
+def test_iter_frames_chunks_and_flags_only_the_last_frame():
+    size = audio_frames.OUTBOUND_CHUNK_SIZE
+    data = bytes(range(256)) * (size * 2 // 256) + b"tail"
+    frames = [audio_frames.parse_frame(f) for f in audio_frames.iter_frames(data, CODEC_MP3, 5, first_seq=10)]
+    assert [h.seq for h, _ in frames] == [10, 11, 12]
+    assert [h.flags for h, _ in frames] == [0, 0, FLAG_END_SEGMENT]
+    assert b"".join(bytes(p) for _, p in frames) == data
+
+
+def test_iter_frames_sends_one_empty_frame_for_empty_audio():
+    frames = list(audio_frames.iter_frames(b"", CODEC_MP3, 1, final_flags=FLAG_END_STREAM))
+    assert len(frames) == 1
+    header, payload = audio_frames.parse_frame(frames[0])
+    assert header.flags == FLAG_END_STREAM and not payload
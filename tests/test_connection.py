@@ -0,0 +1,83 @@
+# tests/test_connection.py
+import asyncio
+import functools
+
+import pytest
+
+from services.connection import Outbox, SlowClientError, TurnScheduler
+
+
+class FakeWebSocket:
+    """Records what was sent; `stalled` makes sends hang like a client that stopped reading."""
+
+    def __init__(self, stalled: bool = False):
+        self.sent = []
+        self.close_code = None
+        self.stalled = stalled
+
+    async def send_text(self, text: str):
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.sent.append(text)
+
+    async def send_bytes(self, data: bytes):
+        await self.send_text(data)
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+
+def test_outbox_sends_in_order(run):
+    async def main():
+        ws = FakeWebSocket()
+        out = Outbox(ws, max_items=4)
+        for i in range(10):
+            await out.send_text(str(i))
+        await out.close()
+        assert ws.sent == [str(i) for i in range(10)]
+        assert ws.close_code is None  # a normal close leaves the socket to its owner
+
+    run(main())
+
+
+def test_outbox_disconnects_slow_client(run):
+    async def main():
+        ws = FakeWebSocket(stalled=True)
+        out = Outbox(ws, max_items=1, max_wait=0.05)
+        await out.send_text("a")  # taken by the writer, which then hangs
+        await asyncio.sleep(0)
+        await out.send_text("b")  # fills the queue
+        with pytest.raises(SlowClientError):
+            await out.send_text("c")
+        await asyncio.sleep(0)
+        assert out.closed
+        assert ws.close_code == 1008
+        with pytest.raises(SlowClientError):
+            await out.send_text("d")
+
+    run(main())
+
+
+def test_new_turn_cancels_the_previous_one(run):
+    async def main():
+        ws = FakeWebSocket()
+        out = Outbox(ws)
+        scheduler = TurnScheduler(out)
+        finished = []
+
+        async def handler(name, trace):
+            await out.send_text(f"{name} start")
+            await asyncio.sleep(0.05 if name == "first" else 0)
+            finished.append(name)
+
+        scheduler.start_turn("text", functools.partial(handler, "first"))
+        await asyncio.sleep(0.01)
+        scheduler.start_turn("text", functools.partial(handler, "second"))
+        await scheduler.current
+        await out.close()
+
+        assert finished == ["second"]
+        assert any('"type":"cancelled"' in m for m in ws.sent)
+        assert ws.sent[-1] == "second start"
+
+    run(main())
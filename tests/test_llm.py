@@ -0,0 +1,47 @@
+# tests/test_llm.py
+from services import llm, upstream
+from services.router import Router
+
+
+def test_chunker_emits_sentences_as_they_complete():
+    chunker = llm.SentenceChunker(min_chars=10)
+    out = []
+    for delta in ["The sky is ", "blue today. It", " might rain", " later! And", " then"]:
+        out += chunker.feed(delta)
+    assert out == ["The sky is blue today.", "It might rain later!"]
+    assert chunker.flush() == "And then"
+    assert chunker.flush() == ""
+
+
+def test_chunker_merges_short_sentences_and_keeps_closing_quotes():
+    chunker = llm.SentenceChunker(min_chars=20)
+    assert chunker.feed("Sure! Hmm. ") == []
+    assert chunker.feed('He said "that works fine." Next') == ['Sure! Hmm. He said "that works fine."']
+    assert chunker.feed("\n") == []  # "Next" is still too short
+    assert chunker.flush() == "Next"
+
+
+def test_failed_reply_is_a_fixed_message_without_upstream_details(run, monkeypatch):
+    async def failing(*args):
+        raise upstream.UpstreamError("gemini", 400, "API key not valid.")
+        yield  # pragma: no cover
+
+    monkeypatch.setattr(llm, "stream_routed_response", failing)
+    history = [llm.user_turn("hi"), llm.model_turn("hello")]
+    reply, new_history = run(llm.get_routed_response("hello?", history, "KEY", ""))
+    assert reply == llm.ERROR_REPLY
+    assert new_history == history
+
+
+def test_failed_search_check_is_not_remembered_as_a_verdict(run, monkeypatch):
+    class FailingModel:
+        async def generate(self, contents):
+            raise upstream.UpstreamError("gemini", 503, "overloaded")
+
+    fresh = Router()
+    monkeypatch.setattr(llm, "router", fresh)
+    monkeypatch.setattr(llm, "get_model", lambda api_key: FailingModel())
+    query = "is the museum open"
+    assert fresh.decide(query) is None  # unsure locally, so Gemini gets asked
+    assert run(llm.should_search_web(query, "KEY")) is False
+    assert fresh.decide(query) is None  # asked again next time
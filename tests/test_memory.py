@@ -0,0 +1,69 @@
+# tests/test_memory.py
+import asyncio
+
+from services.memory import ConversationMemory, estimate_tokens
+
+
+def words(n: int) -> str:
+    return "x" * (4 * n)  # n + 4 estimated tokens
+
+
+def test_evicts_oldest_pairs_and_keeps_the_running_total():
+    memory = ConversationMemory(token_budget=100)
+    for i in range(5):
+        memory.add_exchange(f"q{i} " + words(10), f"a{i} " + words(10))
+    assert memory.tokens == sum(t.tokens for t in memory.turns) <= 100
+    assert memory.turns[0].role == "user"
+    assert memory.contents()[-1]["parts"][0]["text"].startswith("a4")
+    assert memory.contents()[0]["parts"][0]["text"].startswith(f"q{5 - len(memory.turns) // 2}")
+
+
+def test_latest_exchange_is_kept_even_when_over_budget():
+    memory = ConversationMemory(token_budget=10)
+    memory.add_exchange("hi", "hello")
+    memory.add_exchange(words(50), words(50))
+    assert len(memory.turns) == 2
+    assert memory.tokens == 2 * estimate_tokens(words(50))
+
+
+def test_evicted_turns_are_summarized_and_sent_first(run):
+    async def main():
+        seen = []
+
+        async def summarizer(previous, turns):
+            seen.append([t.text for t in turns])
+            return "the user asked about cats"
+
+        memory = ConversationMemory(token_budget=50, summarizer=summarizer)
+        memory.add_exchange("cats? " + words(10), "cats! " + words(10))
+        memory.add_exchange("dogs? " + words(10), "dogs! " + words(10))
+        await memory._summarizing
+        assert seen[0][0].startswith("cats?")
+        first = memory.contents()[0]["parts"][0]["text"]
+        assert first == "Summary of our earlier conversation: the user asked about cats"
+        assert memory.tokens == sum(t.tokens for t in memory._summary_turns) + sum(t.tokens for t in memory.turns)
+        memory.close()
+
+    run(main())
+
+
+def test_turns_past_the_evicted_backlog_cap_are_counted(run):
+    async def main():
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_summarizer(previous, turns):
+            started.set()
+            await release.wait()
+            return "summary"
+
+        memory = ConversationMemory(token_budget=30, summarizer=slow_summarizer)
+        memory.add_exchange(words(10), words(10))
+        for _ in range(4):  # each exchange evicts the previous one while the summarizer is stuck
+            memory.add_exchange(words(10), words(10))
+            await started.wait()
+        assert memory._evicted_tokens == sum(t.tokens for t in memory._evicted) <= 30
+        assert memory.dropped_turns > 0
+        memory.close()
+
+    run(main())
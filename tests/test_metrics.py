@@ -0,0 +1,57 @@
+# tests/test_metrics.py
+import pytest
+
+from services import metrics
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    hist = metrics.Histogram("test_latency_seconds", "test", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(value, "llm")
+    assert hist.render() == [
+        'test_latency_seconds_bucket{stage="llm",le="0.1"} 2',
+        'test_latency_seconds_bucket{stage="llm",le="1"} 3',
+        'test_latency_seconds_bucket{stage="llm",le="+Inf"} 4',
+        'test_latency_seconds_sum{stage="llm"} 3.65',
+        'test_latency_seconds_count{stage="llm"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    counter = metrics.Counter("test_escaped_total", "test", ("provider",))
+    counter.inc('a"b\\c\nd')
+    assert counter.render() == ['test_escaped_total{provider="a\\"b\\\\c\\nd"} 1']
+
+
+def test_gauge_fn_is_read_at_render_time():
+    depth = [3]
+    gauge = metrics.Gauge("test_queue_depth", "test", fn=lambda: depth[0])
+    depth[0] = 7
+    assert gauge.render() == ["test_queue_depth 7"]
+    assert "# TYPE test_queue_depth gauge\ntest_queue_depth 7\n" in metrics.render()
+
+
+def test_turn_trace_summary_groups_spans_and_keeps_first_marks():
+    trace = metrics.TurnTrace("00ff", "text", start=100.0)
+    trace.spans += [("tts", 100.5, 0.25), ("llm", 100.1, 0.5), ("tts", 101.0, 0.125)]
+    trace.marks = {"first_token": 0.2}
+    trace.mark("first_token")  # already recorded: kept
+    summary = trace.summary()
+    assert summary["turn"] == "00ff" and summary["kind"] == "text"
+    assert summary["stages"] == {
+        "tts": {"count": 2, "total_ms": 375.0, "first_ms": 500.0},
+        "llm": {"count": 1, "total_ms": 500.0, "first_ms": 100.0},
+    }
+    assert summary["marks_ms"] == {"first_token": 200.0}
+
+
+def test_span_counts_errors_and_still_records_the_stage():
+    before = metrics.STAGE_ERRORS.values.get(("test_stage",), 0)
+    with metrics.turn("00aa", "text") as trace:
+        with pytest.raises(ValueError):
+            with metrics.span("test_stage"):
+                raise ValueError("boom")
+    assert metrics.STAGE_ERRORS.values[("test_stage",)] == before + 1
+    assert [stage for stage, _, _ in trace.spans] == ["test_stage"]
+    bucket_counts, _ = metrics.STAGE_SECONDS.values[("test_stage",)]
+    assert sum(bucket_counts) >= 1
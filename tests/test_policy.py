@@ -0,0 +1,126 @@
+# tests/test_policy.py
+import asyncio
+
+import pytest
+
+from services.policy import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, PolicyConfig, ProviderPolicy, ProviderUnavailable, TokenBucket,
+    parse_overrides,
+)
+
+
+def test_breaker_opens_probes_once_and_closes():
+    breaker = CircuitBreaker("test", failures=3, reset=10)
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    breaker.opened_at -= 10  # reset period elapsed
+    assert breaker.allow()  # the probe
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # only one probe at a time
+
+    breaker.success()
+    assert breaker.state == CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens_and_released_probe_frees_the_slot():
+    breaker = CircuitBreaker("test", failures=1, reset=10)
+    breaker.failure()
+    breaker.opened_at -= 10
+    assert breaker.allow()
+    breaker.release()  # e.g. the probe was cancelled
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+    breaker.failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_run_retries_then_opens_and_fails_fast(run):
+    async def main():
+        policy = ProviderPolicy("test", PolicyConfig(retries=2, backoff=0.001, failures=3))
+        calls = 0
+
+        async def attempt():
+            nonlocal calls
+            calls += 1
+            raise ConnectionError("reset by peer")
+
+        with pytest.raises(ConnectionError):
+            await policy.run(attempt, retry=True)
+        assert calls == 3
+        assert policy.breaker.state == OPEN
+
+        with pytest.raises(ProviderUnavailable):
+            await policy.run(attempt)
+        assert calls == 3  # not called while open
+
+    run(main())
+
+
+def test_non_idempotent_calls_are_not_retried(run):
+    async def main():
+        policy = ProviderPolicy("test", PolicyConfig(retries=2, backoff=0.001))
+        calls = 0
+
+        async def attempt():
+            nonlocal calls
+            calls += 1
+            raise ConnectionError
+
+        with pytest.raises(ConnectionError):
+            await policy.run(attempt)
+        assert calls == 1
+
+    run(main())
+
+
+def test_throttled_results_back_off_without_tripping_the_breaker(run):
+    async def main():
+        policy = ProviderPolicy("test", PolicyConfig(retries=2, backoff=0.001, backoff_max=0.01, failures=1))
+        statuses = iter([429, 429, 200])
+
+        async def attempt():
+            return next(statuses)
+
+        check = lambda status: ("throttled", 0.001) if status == 429 else None
+        assert await policy.run(attempt, retry=True, check=check) == 200
+        assert policy.breaker.state == CLOSED
+
+    run(main())
+
+
+def test_admission_sheds_calls_past_the_concurrency_limit(run):
+    async def main():
+        policy = ProviderPolicy("test", PolicyConfig(concurrency=1, admission_timeout=0.05))
+
+        async def attempt():
+            await asyncio.sleep(0.2)
+            return "ok"
+
+        results = await asyncio.gather(policy.run(attempt), policy.run(attempt), return_exceptions=True)
+        assert sorted(map(type, results), key=lambda t: t.__name__) == [ProviderUnavailable, str]
+        assert policy.breaker.state == CLOSED
+
+    run(main())
+
+
+def test_token_bucket_allows_a_burst_then_paces():
+    bucket = TokenBucket(rate=10, burst=2)
+    assert bucket.wait_time() == 0.0
+    assert bucket.wait_time() == 0.0
+    assert 0 < bucket.wait_time() <= 0.1
+
+
+def test_parse_overrides():
+    assert parse_overrides("gemini:concurrency=8,rate=5; murf:retries=1") == {
+        "gemini": {"concurrency": 8, "rate": 5.0},
+        "murf": {"retries": 1},
+    }
+    with pytest.raises(ValueError):
+        parse_overrides("gemini:retry=1")
@@ -0,0 +1,84 @@
+# tests/test_reply.py
+import json
+
+import httpx
+
+import main
+from services import llm, upstream
+from services.memory import ConversationMemory
+from services.skill_cache import SkillCache
+
+KEYS = {"assembly": "", "gemini": "key", "news": "", "weather": "", "murf": "", "serp": ""}
+
+
+class FakeOutbox:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text: str):
+        self.sent.append(json.loads(text))
+
+    async def send_bytes(self, data: bytes):
+        pass
+
+
+def test_stream_failing_midway_keeps_the_partial_text_apart_from_the_error(run, monkeypatch):
+    async def half_a_reply(*args):
+        yield "The answer is "
+        raise upstream.UpstreamError("gemini", 500, "internal")
+
+    monkeypatch.setattr(llm, "stream_routed_response", half_a_reply)
+    out, memory = FakeOutbox(), ConversationMemory()
+    run(main.stream_reply(out, "question", KEYS, memory, "0000abcd"))
+    final = out.sent[-1]
+    assert final == {"type": "assistant", "turn": "0000abcd", "text": f"The answer is … {llm.ERROR_REPLY}", "error": "failed"}
+    assert not memory.turns
+
+
+def test_skill_fallbacks_are_marked_as_errors(run, monkeypatch):
+    async def breaker_open(*args, **kwargs):
+        raise main.policy.ProviderUnavailable("newsapi", "breaker open")
+
+    monkeypatch.setattr(main.skill_cache, "get", breaker_open)
+    out = FakeOutbox()
+    trace = main.metrics.TurnTrace("0000abce", "skill")
+    run(main.skill_reply(out, {"name": "news"}, dict(KEYS, news="key"), {"trace": False}, trace))
+    assert out.sent[-1]["error"] == "unavailable"
+    assert out.sent[-1]["text"].startswith("📰 News is unavailable")
+
+
+def canned(*responses):
+    """A stand-in for upstream.get that answers with `responses` in order."""
+    queue = list(responses)
+
+    async def get(url, provider, **kwargs):
+        status, kwargs = queue.pop(0)
+        return httpx.Response(status, request=httpx.Request("GET", url), **kwargs)
+
+    return get
+
+
+def test_skill_5xx_is_reported_without_parsing_the_body_and_falls_back_to_the_old_answer(run, monkeypatch):
+    headlines = {"status": "ok", "articles": [{"title": "Chips get faster"}]}
+    monkeypatch.setattr(main, "skill_cache", SkillCache())
+    monkeypatch.setattr(main.config, "SKILL_NEWS_TTL", 0)
+    monkeypatch.setattr(main.config, "SKILL_NEWS_STALE", 0)
+    monkeypatch.setattr(main.upstream, "get", canned(
+        (502, {"text": "<html>bad gateway</html>"}),
+        (200, {"json": headlines}),
+        (503, {"text": "<html>down</html>"}),
+    ))
+
+    text, error = run(main.get_latest_news("key"))
+    assert error == "failed"
+    assert text == "⚠️ News API error: newsapi returned HTTP 502: Bad Gateway"
+
+    fresh, _ = run(main.get_latest_news("key"))
+    assert run(main.get_latest_news("key")) == (fresh, None)  # expired, but better than the 503
+    assert main.skill_cache.fallbacks == 1
+
+
+def test_weather_for_an_unknown_city_is_not_an_error(run, monkeypatch):
+    monkeypatch.setattr(main, "skill_cache", SkillCache())
+    monkeypatch.setattr(main.upstream, "get", canned((404, {"json": {"cod": "404", "message": "city not found"}})))
+    assert run(main.get_weather("key", "Nowhere")) == ("❌ Could not fetch weather for Nowhere.", None)
@@ -0,0 +1,58 @@
+# tests/test_router.py
+import pytest
+
+from services.router import Router, classify, normalize_query
+
+
+def route(query: str):
+    return classify(normalize_query(query))
+
+
+@pytest.mark.parametrize("query", [
+    "search the web for the latest python release",
+    "search for a poem about autumn",
+    "look up the tallest building",
+    "google who wrote dune",
+])
+def test_explicit_requests_search_even_past_direct_rules(query):
+    assert route(query) is True
+
+
+@pytest.mark.parametrize("query", [
+    "Hi Byte, how are you today?",
+    "how are you today?",
+    "tell me a joke about google",
+    "hello!",
+    "write me a poem about the latest fashion",
+    "12 * (3 + 4)",
+    "def add(a, b): what does this do?",
+])
+def test_small_talk_and_direct_requests_answer_directly(query):
+    assert route(query) is False
+
+
+@pytest.mark.parametrize("query", [
+    "latest python release",
+    "what's the weather in delhi",
+    "who won the match yesterday",
+    "what is the current price of bitcoin",
+])
+def test_freshness_and_live_topics_search(query):
+    assert route(query) is True
+
+
+def test_ambiguous_freshness_words_do_not_force_a_search():
+    assert route("what's the current in a circuit") is not True
+    assert route("explain the difference between a list and a tuple") is False
+
+
+def test_router_caches_and_remembers_remote_verdicts():
+    router = Router(max_entries=2)
+    assert router.decide("hello") is False
+    assert router.decide("Hello ") is False
+    assert router.hits == 1
+    router.remember("is the museum open", True)
+    assert router.decide("is the museum  open") is True
+    router.decide("a")
+    router.decide("b")
+    assert "hello" not in router._decisions  # LRU evicted
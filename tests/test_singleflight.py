@@ -0,0 +1,93 @@
+# tests/test_singleflight.py
+import asyncio
+
+import pytest
+
+from services.singleflight import SingleFlight
+
+
+def test_followers_share_the_leaders_result(run):
+    async def main():
+        flight = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "audio"
+
+        results = await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)))
+        assert results == ["audio"] * 5
+        assert calls == 1
+        assert len(flight) == 0
+
+    run(main())
+
+
+def test_follower_takes_over_when_leader_is_cancelled(run):
+    async def main():
+        flight = SingleFlight()
+        started = asyncio.Event()
+        release = asyncio.Event()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            started.set()
+            await release.wait()
+            return calls
+
+        leader = asyncio.create_task(flight.do("key", fetch))
+        await started.wait()
+        follower = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        started.clear()
+
+        leader.cancel()  # e.g. the leader's turn was interrupted
+        await started.wait()  # the follower runs `fetch` itself
+        release.set()
+
+        assert await follower == 2
+        assert leader.cancelled()
+        assert len(flight) == 0
+
+    run(main())
+
+
+def test_cancelled_follower_leaves_the_leader_running(run):
+    async def main():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return "audio"
+
+        leader = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        release.set()
+        assert await leader == "audio"
+
+    run(main())
+
+
+def test_errors_reach_every_caller(run):
+    async def main():
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("murf down")
+
+        results = await asyncio.gather(*(flight.do("key", fetch) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    run(main())
@@ -0,0 +1,39 @@
+# tests/test_skill_cache.py
+import asyncio
+
+from services.policy import ProviderUnavailable
+from services.skill_cache import SkillCache
+
+
+def test_stale_entry_is_served_while_refreshing(run):
+    async def main():
+        cache = SkillCache()
+        values = iter(["old", "new"])
+
+        async def fetch():
+            return next(values)
+
+        assert await cache.get("news", fetch, ttl=0, stale_ttl=60) == "old"
+        assert await cache.get("news", fetch, ttl=0, stale_ttl=60) == "old"  # stale, refresh started
+        await asyncio.sleep(0.01)
+        assert await cache.get("news", fetch, ttl=0, stale_ttl=60) == "new"
+        assert cache.stats()["stale_hits"] == 2
+
+    run(main())
+
+
+def test_expired_entry_is_the_fallback_while_the_provider_is_down(run):
+    async def main():
+        cache = SkillCache()
+
+        async def fetch():
+            return "headlines"
+
+        async def down():
+            raise ProviderUnavailable("newsapi", "circuit open")
+
+        await cache.get("news", fetch, ttl=0)
+        assert await cache.get("news", down, ttl=0, fallback_on=(ProviderUnavailable,)) == "headlines"
+        assert cache.stats()["fallbacks"] == 1
+
+    run(main())
@@ -0,0 +1,139 @@
+# tests/test_stt.py
+import asyncio
+import threading
+from types import SimpleNamespace
+
+from services import stt
+
+
+class FakeTranscriber:
+    """Stands in for AssemblyAIStreamingTranscriber; `close` can deliver a last final like the SDK does."""
+
+    def __init__(self, last_final: str = ""):
+        self.on_partial_callback = self.on_final_callback = self.on_error_callback = None
+        self.closed = False
+        self.error = None
+        self.audio = []
+        self.endpoints = 0
+        self.last_final = last_final
+
+    def stream_audio(self, chunk):
+        self.audio.append(bytes(chunk))
+
+    def force_endpoint(self):
+        self.endpoints += 1
+
+    def close(self):
+        if self.last_final and not self.closed:
+            self.on_final_callback(self.last_final)
+        self.closed = True
+
+
+async def collect(session):
+    return [event async for event in session]
+
+
+def test_feed_drops_frames_when_the_queue_stays_full(run):
+    async def main():
+        session = stt.STTSession(FakeTranscriber(), max_queued_frames=2, max_wait=0.01)
+        session._pump.cancel()  # stall the upstream side
+        results = [await session.feed(b"x" * 10) for _ in range(5)]
+        assert results == [True, True, False, False, False]
+        assert (session.frames_in, session.dropped_frames, session.dropped_bytes) == (2, 3, 30)
+        assert session.queue_depth == 2
+
+    run(main())
+
+
+def test_sdk_thread_callbacks_arrive_in_order_then_errors_raise(run):
+    async def main():
+        transcriber = FakeTranscriber()
+        session = stt.STTSession(transcriber)
+
+        def sdk_thread():
+            transcriber.on_partial_callback("hel")
+            transcriber.on_partial_callback("hello")
+            transcriber.on_final_callback("Hello.")
+            transcriber.on_error_callback("socket closed")
+
+        threading.Thread(target=sdk_thread).start()
+        events = []
+        try:
+            async for event in session:
+                events.append((event.text, event.final))
+        except stt.STTError as e:
+            assert str(e) == "socket closed"
+        else:
+            raise AssertionError("STTError not raised")
+        assert events == [("hel", False), ("hello", False), ("Hello.", True)]
+        await session.abort()
+
+    run(main())
+
+
+def test_finish_flushes_audio_delivers_the_last_final_and_ends(run):
+    async def main():
+        transcriber = FakeTranscriber(last_final="All done.")
+        session = stt.STTSession(transcriber)
+        await session.feed(b"one")
+        await session.feed(b"two")
+        consumer = asyncio.create_task(collect(session))
+        await session.finish()
+        events = await consumer
+        assert transcriber.audio == [b"one", b"two"] and transcriber.closed
+        assert [(e.text, e.final) for e in events] == [("All done.", True)]
+        assert events[0].endpoint_at is not None
+        assert not await session.feed(b"late")
+
+    run(main())
+
+
+def test_pool_hit_refills_and_idle_transcribers_expire(run, monkeypatch):
+    connected = []
+
+    def connect(api_key, sample_rate):
+        connected.append(FakeTranscriber())
+        return connected[-1]
+
+    monkeypatch.setattr(stt.STTSessionManager, "_connect", staticmethod(connect))
+
+    async def main():
+        manager = stt.STTSessionManager(pool_size=1, max_idle=0.2)
+        manager.prewarm("key")
+        await asyncio.sleep(0.05)
+        assert manager.stats()["idle"] == 1
+
+        session = await manager.open_session("key")
+        assert session.transcriber is connected[0]
+        assert (manager.pool_hits, manager.pool_misses) == (1, 0)
+        await asyncio.sleep(0.05)  # the hit topped the pool up again
+        assert len(connected) == 2 and manager.stats()["idle"] == 1
+
+        await asyncio.sleep(0.3)  # past max_idle
+        assert manager.stats()["idle"] == 0
+        assert connected[1].closed
+        assert not connected[0].closed  # in use, not idle
+        await session.abort()
+        await manager.close()
+
+    run(main())
+
+
+def test_each_turn_is_final_once_and_only_when_formatted():
+    transcriber = stt.AssemblyAIStreamingTranscriber.__new__(stt.AssemblyAIStreamingTranscriber)
+    transcriber._last_final = None
+    partials, finals = [], []
+    transcriber.on_partial_callback, transcriber.on_final_callback = partials.append, finals.append
+
+    def turn(order, text, end=False, formatted=False):
+        event = SimpleNamespace(turn_order=order, transcript=text, end_of_turn=end, turn_is_formatted=formatted)
+        transcriber._on_turn(None, event)
+
+    turn(0, "hello there")
+    turn(0, "hello there", end=True)
+    turn(0, "Hello there.", end=True, formatted=True)
+    turn(0, "Hello there.", end=True, formatted=True)  # repeated delivery
+    turn(1, "and again", end=True)
+    turn(1, "And again.", end=True, formatted=True)
+    assert finals == ["Hello there.", "And again."]
+    assert partials == ["hello there", "hello there", "and again"]
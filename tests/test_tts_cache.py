@@ -0,0 +1,67 @@
+# tests/test_tts_cache.py
+import asyncio
+
+from services.tts_cache import TTSCache
+
+
+def key(n: int) -> str:
+    return TTSCache.make_key(f"sentence {n}", "voice", "MP3")
+
+
+def test_key_ignores_whitespace_and_format_case():
+    assert TTSCache.make_key("Hello  there\n", "v", "mp3") == TTSCache.make_key("Hello there", "v", "MP3")
+    assert TTSCache.make_key("Hello there", "v", "MP3") != TTSCache.make_key("Hello there", "w", "MP3")
+
+
+def test_memory_and_disk_tiers_evict_oldest_first(run, tmp_path):
+    async def main():
+        cache = TTSCache(tmp_path, max_memory_bytes=20, max_disk_bytes=30)
+        for n in range(4):
+            await cache.put(key(n), bytes([n]) * 10)
+        assert await cache.get(key(0)) is None  # off disk too
+        assert not (tmp_path / key(0)).exists()
+        assert cache.stats()["memory_bytes"] == 20
+        assert cache.stats()["disk_bytes"] == 30
+        assert cache.evictions == 1
+
+        assert await cache.get(key(1)) == b"\x01" * 10  # from disk
+        assert cache.hits_disk == 1
+        assert await cache.get(key(1)) == b"\x01" * 10  # now from memory
+        assert cache.hits_memory == 1
+
+    run(main())
+
+
+def test_index_reloads_and_skips_foreign_files(run, tmp_path):
+    async def main():
+        cache = TTSCache(tmp_path, max_memory_bytes=100, max_disk_bytes=100)
+        await cache.put(key(0), b"audio")
+        (tmp_path / "notes.txt").write_text("keep me")
+        (tmp_path / ".tmp-abc").write_bytes(b"half written")
+
+        reloaded = TTSCache(tmp_path, max_memory_bytes=100, max_disk_bytes=100)
+        assert reloaded.stats()["disk_entries"] == 1
+        assert await reloaded.get(key(0)) == b"audio"
+        assert (tmp_path / "notes.txt").exists()
+        assert not (tmp_path / ".tmp-abc").exists()
+
+    run(main())
+
+
+def test_concurrent_misses_share_one_request(run, tmp_path):
+    async def main():
+        cache = TTSCache(tmp_path, max_memory_bytes=100, max_disk_bytes=100)
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return b"audio"
+
+        results = await asyncio.gather(*(cache.get_or_create(key(0), fetch) for _ in range(3)))
+        assert results == [b"audio"] * 3
+        assert calls == 1
+        assert cache.misses == 1 and cache.coalesced == 2
+
+    run(main())
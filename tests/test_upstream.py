@@ -0,0 +1,38 @@
+# tests/test_upstream.py
+import httpx
+import pytest
+
+from services import upstream
+
+
+def response(status: int, **kwargs) -> httpx.Response:
+    request = httpx.Request("GET", "https://api.example.test/search.json?q=hi&api_key=MYSECRETKEY")
+    return httpx.Response(status, request=request, **kwargs)
+
+
+def test_error_message_uses_the_provider_message_and_never_the_url():
+    r = response(400, json={"error": {"code": 400, "message": "API key not valid.", "status": "INVALID_ARGUMENT"}})
+    with pytest.raises(upstream.UpstreamError) as exc:
+        upstream.raise_for_status(r, "gemini")
+    assert exc.value.status_code == 400
+    assert str(exc.value) == "gemini returned HTTP 400: API key not valid."
+    assert "MYSECRETKEY" not in str(exc.value)
+
+
+def test_error_detail_handles_sse_lists_strings_and_non_json():
+    assert upstream.error_detail(response(403, json=[{"error": {"message": "denied"}}])) == "denied"
+    assert upstream.error_detail(response(401, json={"error": "Invalid API key."})) == "Invalid API key."
+    assert upstream.error_detail(response(400, json={"errorMessage": "Invalid voice", "errorCode": 400})) == "Invalid voice"
+    assert upstream.error_detail(response(502, text="<html>bad gateway</html>")) == "Bad Gateway"
+
+
+def test_success_passes():
+    upstream.raise_for_status(response(200, json={}), "serpapi")
+
+
+def test_server_errors_are_told_apart_from_client_errors():
+    with pytest.raises(upstream.UpstreamServerError):
+        upstream.raise_for_status(response(503, text="down"), "newsapi")
+    with pytest.raises(upstream.UpstreamError) as exc:
+        upstream.raise_for_status(response(401, json={"message": "bad key"}), "newsapi")
+    assert not isinstance(exc.value, upstream.UpstreamServerError)
@@ -0,0 +1,52 @@
+# tests/test_vad.py
+import numpy as np
+
+from services.vad import VoiceActivityDetector
+
+RATE = 16000
+CHUNK = RATE * 2 * 128 // 1000  # 128 ms, like the browser mic frames (not a whole number of VAD frames)
+
+
+def pcm(*segments) -> bytes:
+    """segments: (seconds, amplitude) pairs; amplitude 0 is near-silent noise, else a 220 Hz tone."""
+    rng = np.random.default_rng(0)
+    parts = []
+    for seconds, amplitude in segments:
+        n = int(seconds * RATE)
+        if amplitude:
+            parts.append(amplitude * np.sin(2 * np.pi * 220 * np.arange(n) / RATE))
+        else:
+            parts.append(rng.normal(0, 0.0005, n))
+    return (np.concatenate(parts) * 32767).astype("<i2").tobytes()
+
+
+def feed(vad, data: bytes):
+    results = [vad.process(data[off:off + CHUNK]) for off in range(0, len(data), CHUNK)]
+    return results, b"".join(r.audio for r in results) + vad.flush()
+
+
+def test_trims_silence_and_reports_end_of_speech_once():
+    vad = VoiceActivityDetector(preroll_ms=200, hangover_ms=300, end_of_speech_ms=700)
+    results, out = feed(vad, pcm((1.0, 0), (1.0, 0.3), (1.5, 0)))
+    assert sum(r.speech_started for r in results) == 1
+    assert sum(r.speech_ended for r in results) == 1
+    assert vad.utterances == 1
+    # preroll + speech + hangover, give or take a frame at each edge
+    assert abs(len(out) / 2 / RATE - 1.5) < 0.05
+    assert vad.bytes_out == len(out)
+    assert abs(vad.trimmed_ratio - 2.0 / 3.5) < 0.02
+
+
+def test_silence_only_forwards_nothing():
+    vad = VoiceActivityDetector()
+    results, out = feed(vad, pcm((2.0, 0)))
+    assert out == b""
+    assert not any(r.speech_started or r.speech_ended for r in results)
+    assert vad.trimmed_ratio == 1.0
+
+
+def test_model_can_veto_frames_that_pass_the_energy_gate():
+    vad = VoiceActivityDetector(model=lambda frames, rate: np.zeros(len(frames), dtype=bool))
+    _, out = feed(vad, pcm((0.5, 0.3)))
+    assert out == b""
+    assert vad.utterances == 0
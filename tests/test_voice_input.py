@@ -0,0 +1,102 @@
+# tests/test_voice_input.py
+import asyncio
+import json
+
+import main
+from services import audio_frames
+from services.audio_frames import CODEC_PCM16, FLAG_END_STREAM
+
+
+class FakeOutbox:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text: str):
+        self.sent.append(json.loads(text))
+
+
+class FakeScheduler:
+    def interrupt(self):
+        pass
+
+
+class FakeSession:
+    dropped_frames = 0
+    vad = None
+    queue_depth = 0
+
+    def __init__(self):
+        self.audio = []
+        self.finished = asyncio.Event()
+
+    async def feed(self, chunk):
+        self.audio.append(bytes(chunk))
+
+    async def finish(self):
+        self.finished.set()
+
+    async def abort(self):
+        self.finished.set()
+
+    async def __aiter__(self):
+        await self.finished.wait()
+        return
+        yield  # pragma: no cover
+
+
+def frames(count: int):
+    for seq in range(count):
+        flags = FLAG_END_STREAM if seq == count - 1 else 0
+        yield audio_frames.encode_frame(CODEC_PCM16, 42, seq, bytes([seq]) * 320, flags)
+
+
+async def send_utterance(count: int, out, mic_streams):
+    for frame in frames(count):
+        await main.handle_audio_frame(out, frame, mic_streams, {"assembly": "key"}, {}, None, FakeScheduler())
+        await asyncio.sleep(0)
+
+
+def test_failed_stt_open_is_not_retried_for_every_frame(run, monkeypatch):
+    attempts = 0
+
+    async def open_session(api_key):
+        nonlocal attempts
+        attempts += 1
+        raise main.stt.STTError("connect failed: HTTP 401")
+
+    monkeypatch.setattr(main.stt_manager, "open_session", open_session)
+
+    async def utterance():
+        out, mic_streams = FakeOutbox(), {}
+        await send_utterance(10, out, mic_streams)
+        return out, mic_streams
+
+    out, mic_streams = run(utterance())
+    assert attempts == 1
+    assert [m["type"] for m in out.sent] == ["system"]
+    assert mic_streams == {}  # forgotten once the utterance ended
+
+
+def test_frames_received_while_connecting_are_replayed_in_order(run, monkeypatch):
+    connected = asyncio.Event()
+    session = FakeSession()
+
+    async def open_session(api_key):
+        await connected.wait()
+        return session
+
+    monkeypatch.setattr(main.stt_manager, "open_session", open_session)
+
+    async def utterance():
+        out, mic_streams = FakeOutbox(), {}
+        # the receive loop keeps going while the handshake is pending
+        await asyncio.wait_for(send_utterance(5, out, mic_streams), 0.5)
+        assert session.audio == []
+        connected.set()
+        await asyncio.wait_for(session.finished.wait(), 1)
+        await asyncio.sleep(0.01)  # the consumer sees the end of the transcript stream
+        return mic_streams
+
+    mic_streams = run(utterance())
+    assert session.audio == [bytes([seq]) * 320 for seq in range(5)]
+    assert mic_streams == {}